@@ -0,0 +1,93 @@
+# bench_alerts_summary.py
+# Regression check and timing for the columnar alert summary engine in
+# scripts/alerts_summary.py against the original row-wise implementation,
+# for the admin view and every (city, branch) manager scope.
+#
+#   python benchmarks/bench_alerts_summary.py [--forecast data/stock_forecast_next_7_days_with_alerts.csv]
+import argparse
+import math
+import numpy as np
+import pandas as pd
+
+from common import DATA_DIR, timed
+from scripts.alerts_summary import ADMIN_SCOPE, compute_alerts_summary, compute_all_summaries
+
+
+def compute_alerts_summary_rowwise(forecast_df, filter_city=None, filter_branch=None):
+    """The original dashboard summary with df.apply(axis=1), kept as the reference."""
+    if forecast_df.empty:
+        return {}
+    df = forecast_df.copy()
+    if filter_city:
+        df = df[df["city_name"] == filter_city]
+    if filter_branch:
+        df = df[df["branch_name"] == filter_branch]
+
+    alert_cols = [c for c in df.columns if c.endswith("_alert")]
+    understock_mask = np.column_stack([df[c] == "UNDERSTOCK" for c in alert_cols]).any(axis=1)
+    overstock_mask = np.column_stack([df[c] == "OVERSTOCK" for c in alert_cols]).any(axis=1)
+
+    under = df[understock_mask]
+    over = df[overstock_mask]
+
+    top_under_products = under.groupby("product_name").size().sort_values(ascending=False).head(10)
+    top_under_stores = under.groupby(["city_name","branch_name"]).size().sort_values(ascending=False).head(10)
+
+    forecast_cols = [c for c in df.columns if c.startswith("day_") and c.endswith("_forecast")]
+
+    def calc_reorder(row):
+        future = row[forecast_cols].values.astype(float)
+        return max(0, round(float(future.max() - row["stock_hour6_22_cnt"]),2))
+
+    df["reorder_qty"] = df.apply(calc_reorder, axis=1)
+    reorder_list = df[df["reorder_qty"] > 0].sort_values("reorder_qty", ascending=False).head(20)
+
+    return {
+        "total_rows": len(df),
+        "total_understock": len(under),
+        "total_overstock": len(over),
+        "top_under_products": top_under_products.reset_index().values.tolist(),
+        "top_under_stores": top_under_stores.reset_index().values.tolist(),
+        "reorder_list": reorder_list[["store_id","product_id","city_name","branch_name","product_name","stock_hour6_22_cnt","reorder_qty"]].to_dict(orient="records")
+    }
+
+
+def same(a, b):
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) and isinstance(b, float):
+        return a == b or (math.isnan(a) and math.isnan(b))
+    return a == b
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--forecast", default=f"{DATA_DIR}/stock_forecast_next_7_days_with_alerts.csv")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    fc = pd.read_csv(args.forecast)
+    scopes = [ADMIN_SCOPE] + list(fc.groupby(["city_name","branch_name"]).indices)
+    print(f"Forecast rows: {len(fc)}, manager scopes: {len(scopes) - 1}")
+
+    t_old, old = timed(compute_alerts_summary_rowwise, fc, repeat=args.repeat)
+    t_new, new = timed(compute_alerts_summary, fc, repeat=args.repeat)
+    print(f"Admin summary, row-wise:  {t_old:8.4f}s")
+    print(f"Admin summary, columnar:  {t_new:8.4f}s  ({t_old / t_new:.1f}x faster)")
+
+    t_all, summaries = timed(compute_all_summaries, fc)
+    print(f"All scopes materialized:  {t_all:8.4f}s")
+
+    mismatches = [s for s in scopes
+                  if not same(compute_alerts_summary_rowwise(fc, *s), summaries[s])]
+    mismatches += [] if same(old, new) else ["compute_alerts_summary"]
+    print(f"Scopes checked: {len(scopes)}, mismatches: {len(mismatches)}")
+    if mismatches:
+        print("Mismatching scopes:", mismatches[:10])
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# bench_compact_forecast.py
+# Per-worker memory of the web app's forecast state (frame + StoreIndex +
+# ForecastQuery) when each worker reads the Parquet copy versus memory-maps the
+# compact float32/int8 file from scripts/compact_forecast.py. Workers are
+# separate processes like gunicorn's, holding their state at the same time, so
+# Pss/Private show how much of RSS is shared through the page cache (Linux).
+#
+#   python benchmarks/bench_compact_forecast.py --rows 1000000 --workers 4
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import pandas as pd
+
+from bench_forecast_api import scaled_forecast
+from common import timed
+from scripts.compact_forecast import CompactForecast, widen_forecast
+from scripts.storage import read_frame, write_frame
+from web.forecast_query import ForecastQuery
+from web.store_index import StoreIndex
+
+
+def memory_mb():
+    """Rss, Pss and Private MB of this process from /proc/self/smaps_rollup."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return fields.get("Rss", 0), fields.get("Pss", 0), private
+
+
+def worker(path, barrier, results):
+    before = memory_mb()
+    t_load, fc = timed(read_frame, path)
+    query = ForecastQuery(fc, StoreIndex(pd.DataFrame(), fc))
+    query.page(1, 100, alert="UNDERSTOCK", sort="city_name,branch_name")
+    barrier.wait()              # every worker holds its state now
+    after = memory_mb()
+    results.put((before, after, t_load, fc.memory_usage(deep=True).sum() / 1e6))
+    barrier.wait()
+
+
+def measure(path, workers):
+    ctx = mp.get_context("spawn")
+    barrier, results = ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(path, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    n = len(rows)
+    rss = sum(a[0] - b[0] for b, a, _, _ in rows) / n
+    pss = sum(a[1] - b[1] for b, a, _, _ in rows) / n
+    private = sum(a[2] - b[2] for b, a, _, _ in rows) / n
+    load = sum(r[2] for r in rows) / n
+    frame = rows[0][3]
+    return rss, pss, private, load, frame
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    fc = scaled_forecast(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        parquet = os.path.join(tmp, "forecast.parquet")
+        compact = os.path.join(tmp, "forecast.arrow")
+        write_frame(fc, parquet)
+        CompactForecast.from_frame(fc).write(compact)
+
+        same = widen_forecast(read_frame(compact)).to_csv(index=False) == fc.to_csv(index=False)
+        print(f"Forecast rows: {len(fc)}, workers: {args.workers}, compact round-trip identical: {same}")
+        print(f"{'format':<10}{'file MB':>9}{'frame MB':>10}{'load s':>8}"
+              f"{'RSS MB/worker':>15}{'PSS MB/worker':>15}{'private MB/worker':>19}")
+        for name, path in [("parquet", parquet), ("compact", compact)]:
+            rss, pss, private, load, frame = measure(path, args.workers)
+            print(f"{name:<10}{os.path.getsize(path) / 1e6:9.1f}{frame:10.1f}{load:8.3f}"
+                  f"{rss:15.1f}{pss:15.1f}{private:19.1f}")
+        if not same:
+            raise SystemExit("compact forecast does not round-trip to the CSV values")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench_features.py
+# Equivalence check and timing for the grouped-window kernel in
+# scripts/features.py against groupby().shift / transform(lambda x: x.rolling(w).mean()).
+#
+#   python benchmarks/bench_features.py --rows 50000 5000000
+import argparse
+import numpy as np
+import pandas as pd
+
+from common import timed
+from scripts.features import KEYS, add_sales_features, sort_series
+
+LAGS = (1,)
+WINDOWS = (7, 14)
+
+
+def make_series(rows, days=120, nan_rate=0.001, seed=0):
+    """Sorted store/product/dt frame with ragged series lengths and a few NaN sales."""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, 2 * days, size=max(1, rows // days))
+    lengths = lengths[np.cumsum(lengths) <= rows] if lengths.sum() > rows else lengths
+    n = int(lengths.sum())
+    series = np.repeat(np.arange(len(lengths)), lengths)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    sales = np.round(rng.gamma(2.0, 1.5, size=n), 2)
+    sales[rng.random(n) < nan_rate] = np.nan
+    return pd.DataFrame({
+        "store_id": series // 1000,
+        "product_id": series % 1000,
+        "dt": pd.Timestamp("2024-01-01") + pd.to_timedelta(np.arange(n) - starts, unit="D"),
+        "sale_amount": sales,
+    })
+
+
+def pandas_features(df):
+    g = df.groupby(KEYS)["sale_amount"]
+    out = df.copy()
+    for k in LAGS:
+        out[f"sales_lag_{k}"] = g.shift(k)
+    for w in WINDOWS:
+        out[f"sales_ma_{w}"] = g.transform(lambda x: x.rolling(w).mean())
+    return out
+
+
+def check(expected, actual, cols):
+    for col in cols:
+        a, b = expected[col].to_numpy(), actual[col].to_numpy()
+        if not (np.array_equal(np.isnan(a), np.isnan(b)) and np.allclose(a, b, rtol=1e-9, atol=1e-9, equal_nan=True)):
+            raise AssertionError(f"{col} differs from pandas")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[50_000, 5_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cols = [f"sales_lag_{k}" for k in LAGS] + [f"sales_ma_{w}" for w in WINDOWS]
+    for rows in args.rows:
+        df = sort_series(make_series(rows))
+        t_pd, expected = timed(pandas_features, df)
+        t_full, full = timed(add_sales_features, df, LAGS, WINDOWS, repeat=args.repeat)
+        t_direct, direct = timed(add_sales_features, df, LAGS, WINDOWS, method="direct", repeat=args.repeat)
+        t_tail, tail = timed(add_sales_features, df, LAGS, WINDOWS, tail_only=True, repeat=args.repeat)
+
+        check(expected, full, cols)
+        check(expected, direct, cols)
+        check(expected.groupby(KEYS).tail(1).reset_index(drop=True), tail, cols)
+
+        print(f"rows={len(df):>9,}  series={len(tail):>7,}")
+        print(f"  pandas groupby/rolling lambda: {t_pd:8.3f}s")
+        print(f"  kernel, cumsum:                {t_full:8.3f}s  ({t_pd / t_full:.0f}x)")
+        print(f"  kernel, direct windows:        {t_direct:8.3f}s  ({t_pd / t_direct:.0f}x)")
+        print(f"  kernel, tail only:             {t_tail:8.3f}s  ({t_pd / t_tail:.0f}x)")
+        print("  matches pandas: True")
+
+
+if __name__ == "__main__":
+    main()
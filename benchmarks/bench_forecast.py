@@ -0,0 +1,93 @@
+# bench_forecast.py
+# Compare the legacy row-by-row forecast loop against the batched engine in
+# scripts/xgb_forecast.py and check both produce the same CSV.
+#
+#   python benchmarks/bench_forecast.py --stores 50 --products 40 --days 30
+import argparse
+import io
+import joblib
+import pandas as pd
+import warnings
+
+from common import make_history, timed
+from scripts.xgb_forecast import (
+    MODEL_PATH, ENCODERS_PATH, FEATURES, FORECAST_DAYS, build_latest, forecast_batch,
+)
+
+
+def forecast_rowwise(model, latest_df, forecast_days=FORECAST_DAYS):
+    """The original per-row, per-day predict loop, kept as the reference engine."""
+    results = []
+    for idx, row in latest_df.iterrows():
+        row_copy = row.copy()
+        forecasts, alerts = [], []
+
+        for d in range(forecast_days):
+            X_pred = row_copy[FEATURES].values.reshape(1, -1)
+            y_pred = model.predict(X_pred)[0]
+            forecasts.append(round(y_pred,2))
+
+            stock = row_copy["stock_hour6_22_cnt"]
+            if y_pred > stock:
+                alerts.append("UNDERSTOCK")
+            elif y_pred < stock*0.5:
+                alerts.append("OVERSTOCK")
+            else:
+                alerts.append("OK")
+
+            row_copy["sales_lag_1"] = y_pred
+            row_copy["sales_ma_7"] = (row_copy["sales_ma_7"]*6 + y_pred)/7
+            row_copy["sales_ma_14"] = (row_copy["sales_ma_14"]*13 + y_pred)/14
+
+        res = {
+            "store_id": row["store_id"],
+            "product_id": row["product_id"],
+            "city_name": row["city_name"],
+            "company_name": row["company_name"],
+            "branch_name": row["branch_name"],
+            "product_name": row["product_name"],
+            "stock_hour6_22_cnt": row["stock_hour6_22_cnt"]
+        }
+        for i in range(forecast_days):
+            res[f"day_{i+1}_forecast"] = forecasts[i]
+            res[f"day_{i+1}_alert"] = alerts[i]
+        results.append(res)
+
+    return pd.DataFrame(results)
+
+
+def to_csv_bytes(df):
+    buf = io.StringIO()
+    df.to_csv(buf, index=False)
+    return buf.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stores", type=int, default=20)
+    parser.add_argument("--products", type=int, default=25)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    model = joblib.load(MODEL_PATH)
+    label_encoders = joblib.load(ENCODERS_PATH)
+
+    df = make_history(args.stores, args.products, args.days)
+    latest_df = build_latest(df, label_encoders)
+    print(f"History rows: {len(df)}, series: {len(latest_df)}")
+
+    t_row, out_row = timed(forecast_rowwise, model, latest_df)
+    t_batch, out_batch = timed(forecast_batch, model, latest_df, repeat=args.repeat)
+
+    same = to_csv_bytes(out_row) == to_csv_bytes(out_batch)
+    print(f"Row-wise engine: {t_row:8.3f}s")
+    print(f"Batched engine:  {t_batch:8.3f}s  ({t_row / t_batch:.1f}x faster)")
+    print(f"Identical CSV output: {same}")
+    if not same:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
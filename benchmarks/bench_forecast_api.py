@@ -0,0 +1,51 @@
+# bench_forecast_api.py
+# Latency of paginated forecast queries (web/forecast_query.py) as the
+# forecast table grows, against rendering the whole table with to_html.
+#
+#   python benchmarks/bench_forecast_api.py --rows 10000 1000000
+import argparse
+import numpy as np
+import pandas as pd
+
+from common import DATA_DIR, timed
+from web.forecast_query import ForecastQuery
+from web.store_index import StoreIndex
+
+QUERIES = [
+    {},
+    {"alert": "UNDERSTOCK", "sort": "city_name,branch_name"},
+    {"sort": "-day_1_forecast"},
+    {"city": "Bangalore", "branch": "Branch 1", "alert": "OVERSTOCK"},
+]
+
+
+def scaled_forecast(rows):
+    """The shipped forecast CSV tiled to `rows` rows, with distinct store IDs per copy."""
+    fc = pd.read_csv(f"{DATA_DIR}/stock_forecast_next_7_days_with_alerts.csv")
+    reps = -(-rows // len(fc))
+    big = pd.concat([fc] * reps, ignore_index=True).iloc[:rows]
+    big["store_id"] = big["store_id"] + np.repeat(np.arange(reps), len(fc))[:rows] * 1000
+    return big
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        fc = scaled_forecast(rows)
+        t_build, query = timed(lambda: ForecastQuery(fc, StoreIndex(pd.DataFrame(), fc)))
+        print(f"rows={rows:>9,}  build index+masks: {t_build:.3f}s")
+        for q in QUERIES:
+            t_first, _ = timed(query.page, 1, args.page_size, **q)
+            t_page, _ = timed(query.page, 5, args.page_size, repeat=20, **q)
+            print(f"  {str(q):<60} first: {t_first * 1e3:8.2f}ms  cached page: {t_page * 1e3:6.2f}ms")
+        if rows <= 100_000:
+            t_html, _ = timed(fc.to_html, index=False)
+            print(f"  full to_html (old /predictions): {t_html * 1e3:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
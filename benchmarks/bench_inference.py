@@ -0,0 +1,76 @@
+# bench_inference.py
+# Model load time and predictions/sec of each backend in scripts/inference.py
+# (pickled XGBRegressor, native UBJSON booster with inplace_predict, and the
+# treelite-compiled predictor when treelite/tl2cgen are installed), and a check
+# that each produces the same 7-day forecast as the sklearn wrapper. The
+# compiled predictor sums trees in its own float32 order, so it is checked to
+# a tolerance instead: predictions within 1e-5 relative, forecasts within one
+# rounding step (0.01, plus float32 error). The 1-row column is the per-call
+# latency a single-store request pays.
+#
+#   python benchmarks/bench_inference.py --stores 200 --products 100 --days 30
+import argparse
+import os
+import shutil
+import tempfile
+import warnings
+import joblib
+import numpy as np
+
+from common import make_history, timed
+from scripts.inference import (
+    BACKEND_CLASSES, MODEL_PATH, booster_path, compile_model, save_booster, tl2cgen,
+)
+from scripts.xgb_forecast import ENCODERS_PATH, FEATURES, build_latest, forecast_batch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stores", type=int, default=200)
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    latest_df = build_latest(make_history(args.stores, args.products, args.days), joblib.load(ENCODERS_PATH))
+    X = latest_df[FEATURES].to_numpy(dtype=np.float64)
+    print(f"Series: {len(latest_df)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = os.path.join(tmp, os.path.basename(MODEL_PATH))
+        shutil.copy(MODEL_PATH, model_path)
+        save_booster(joblib.load(model_path).get_booster(), booster_path(model_path))
+        names = ["sklearn", "booster"]
+        if tl2cgen is not None:
+            t_compile, _ = timed(compile_model, model_path)
+            print(f"Compiled predictor built in {t_compile:.1f}s")
+            names.append("compiled")
+        else:
+            print("treelite/tl2cgen not installed; skipping the compiled backend")
+
+        print(f"{'backend':<10}{'load s':>9}{'predict s':>11}{'rows/s':>14}{'1-row ms':>10}"
+              f"{'7-day forecast s':>18}  same forecast  max forecast diff")
+        reference = None
+        for name in names:
+            t_load, backend = timed(BACKEND_CLASSES[name], model_path, repeat=args.repeat)
+            t_pred, pred = timed(backend.predict, X, repeat=args.repeat)
+            t_one, _ = timed(backend.predict, X[:1], repeat=200)
+            t_fc, out = timed(forecast_batch, backend, latest_df, repeat=args.repeat)
+            if reference is None:
+                reference = (pred, out)
+            forecast_cols = [c for c in out.columns if c.endswith("_forecast")]
+            diff = np.abs(out[forecast_cols].to_numpy(np.float64)
+                          - reference[1][forecast_cols].to_numpy(np.float64)).max()
+            same = out.to_csv(index=False) == reference[1].to_csv(index=False)
+            print(f"{name:<10}{t_load:9.3f}{t_pred:11.4f}{len(X) / t_pred:14,.0f}{t_one * 1000:10.3f}"
+                  f"{t_fc:18.3f}  {str(same):<13}  {diff:.4f}")
+            if name == "booster" and not same:
+                raise SystemExit("booster backend forecast differs from the sklearn wrapper")
+            if name == "compiled" and not (np.allclose(pred, reference[0], rtol=1e-5, atol=1e-4)
+                                           and diff <= 0.0101):
+                raise SystemExit("compiled backend predictions differ from the sklearn wrapper beyond tolerance")
+
+
+if __name__ == "__main__":
+    main()
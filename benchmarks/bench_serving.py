@@ -0,0 +1,155 @@
+# bench_serving.py
+# Load test of the sync deployment (gunicorn web.app:app, as in the Procfile)
+# against the async one (uvicorn web.asgi:app) with the same number of
+# worker processes: heavy clients keep the dashboard, sorted forecast pages
+# and CSV exports busy while light clients hit the login page and branch
+# dropdown. Reports throughput and latency percentiles per class, and checks
+# both servers return the same bodies.
+#
+#   python benchmarks/bench_serving.py --duration 20 --heavy-clients 4 --light-clients 4
+#   python benchmarks/bench_serving.py --workdir /tmp/suite-5m --workers 2
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import numpy as np
+
+from common import ROOT_DIR
+
+SERVERS = {
+    "sync": lambda port, workers: [sys.executable, "-m", "gunicorn", "--workers", str(workers),
+                                   "--bind", f"127.0.0.1:{port}", "web.app:app"],
+    "asgi": lambda port, workers: [sys.executable, "-m", "uvicorn", "web.asgi:app", "--workers", str(workers),
+                                   "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+}
+HEAVY = [
+    "/dashboard",
+    "/api/forecast?page=1&page_size=500&sort=-day_1_forecast",
+    "/api/forecast?page=3&page_size=500&alert=UNDERSTOCK&sort=city_name,branch_name",
+    "/download_forecast?format=csv",
+]
+LIGHT = [
+    "/",
+    "/get_branches_for_city?city=Bangalore",
+]
+# Same bytes expected from both servers
+CHECKED = HEAVY[1:] + LIGHT[1:]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(port, path, cookie=None, form=None, timeout=120):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    headers = {"Connection": "close"}
+    if cookie:
+        headers["Cookie"] = cookie
+    body = None
+    if form is not None:
+        body = urllib.parse.urlencode(form)
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    try:
+        conn.request("POST" if form is not None else "GET", path, body=body, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.getheader("Set-Cookie"), response.read()
+    finally:
+        conn.close()
+
+
+def login(port):
+    _, cookie, _ = request(port, "/", form={"username": "admin", "password": "admin123", "role": "admin"})
+    return cookie.split(";", 1)[0]
+
+
+def start_server(mode, workers, workdir):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR, PYTHONWARNINGS="ignore")
+    proc = subprocess.Popen(SERVERS[mode](port, workers), cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if request(port, "/", timeout=5)[0] == 200:
+                return proc, port
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise SystemExit(f"{mode} server did not start")
+
+
+def client(port, paths, stop, latencies, errors):
+    cookie = login(port)
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            status, _, _ = request(port, paths[i % len(paths)], cookie)
+            if status != 200:
+                errors.append(status)
+        except OSError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+        i += 1
+
+
+def load_test(port, args):
+    stop = threading.Event()
+    results = {"heavy": ([], []), "light": ([], [])}
+    threads = [threading.Thread(target=client, args=(port, HEAVY, stop) + results["heavy"])
+               for _ in range(args.heavy_clients)]
+    threads += [threading.Thread(target=client, args=(port, LIGHT, stop) + results["light"])
+                for _ in range(args.light_clients)]
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workdir", default=ROOT_DIR, help="directory with data/, model/ and label_encoders.pkl")
+    parser.add_argument("--modes", default="sync,asgi")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--heavy-clients", type=int, default=4)
+    parser.add_argument("--light-clients", type=int, default=4)
+    args = parser.parse_args()
+
+    bodies = {}
+    print(f"{'mode':<6}{'class':<7}{'requests':>9}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for mode in args.modes.split(","):
+        proc, port = start_server(mode, args.workers, args.workdir)
+        try:
+            cookie = login(port)
+            bodies[mode] = [request(port, path, cookie)[2] for path in CHECKED]
+            results = load_test(port, args)
+        finally:
+            proc.terminate()
+            proc.wait()
+        for label, (latencies, errors) in results.items():
+            ms = np.array(latencies or [np.nan]) * 1000
+            print(f"{mode:<6}{label:<7}{len(latencies):9d}{len(latencies) / args.duration:9.1f}"
+                  f"{np.percentile(ms, 50):10.1f}{np.percentile(ms, 95):10.1f}{np.percentile(ms, 99):10.1f}"
+                  f"{len(errors):8d}")
+
+    if len(bodies) > 1:
+        first, *others = bodies.values()
+        same = all(b == first for b in others)
+        print(f"same responses from every mode: {same}")
+        if not same:
+            raise SystemExit("servers returned different responses")
+
+
+if __name__ == "__main__":
+    main()
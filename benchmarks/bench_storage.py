@@ -0,0 +1,55 @@
+# bench_storage.py
+# Load time, file size and in-memory footprint of the cleaned history stored
+# as CSV (pd.read_csv with inference) versus Parquet/Feather via scripts/storage.py.
+#
+#   python benchmarks/bench_storage.py --stores 100 --products 100 --days 60
+import argparse
+import os
+import tempfile
+import pandas as pd
+
+from common import make_history, timed
+from scripts.storage import HISTORY_WEB_COLUMNS, read_frame, write_frame
+
+
+def mem_mb(df):
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stores", type=int, default=50)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_history(args.stores, args.products, args.days)
+    print(f"History rows: {len(df)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "history.csv")
+        df.to_csv(csv_path, index=False)
+
+        def legacy_read():
+            out = pd.read_csv(csv_path)
+            out["dt"] = pd.to_datetime(out["dt"])
+            return out
+
+        rows = [("csv (read_csv)", csv_path, legacy_read)]
+        for ext in (".csv", ".parquet", ".feather"):
+            path = os.path.join(tmp, "history_typed" + ext)
+            write_frame(df, path)
+            rows.append((f"{ext[1:]} (storage)", path, lambda p=path: read_frame(p)))
+            rows.append((f"{ext[1:]} (web columns)", path,
+                         lambda p=path: read_frame(p, columns=HISTORY_WEB_COLUMNS)))
+
+        print(f"{'format':<24}{'size MB':>10}{'load s':>10}{'memory MB':>12}")
+        for name, path, load in rows:
+            seconds, frame = timed(load, repeat=args.repeat)
+            size = os.path.getsize(path) / 1e6
+            print(f"{name:<24}{size:>10.2f}{seconds:>10.3f}{mem_mb(frame):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# bench_train.py
+# Regression check and wall time / peak memory of the cached-feature training
+# pipeline (scripts/train_cache.py + xgb_train.py) against the original
+# pandas pipeline. Each run is a fresh process so peak RSS is its own.
+#
+#   python benchmarks/bench_train.py --stores 200 --products 100 --days 120 --n-estimators 100
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+from sklearn.metrics import mean_squared_error
+import xgboost as xgb
+
+from common import make_history
+from scripts.storage import read_frame, write_frame
+from scripts.train_cache import CATEGORICAL_COLS, FEATURES, CacheIter, FeatureCache
+
+
+def peak_rss_mb():
+    # VmHWM is reset on exec, unlike ru_maxrss which a spawned child inherits
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def legacy_frames(path):
+    """The original xgb_train.py data preparation, kept as the reference."""
+    df = read_frame(path)
+    df["dt"] = pd.to_datetime(df["dt"])
+    df = df.sort_values(["store_id","product_id","dt"])
+    df["sales_lag_1"] = df.groupby(["store_id","product_id"])["sale_amount"].shift(1)
+    df["sales_ma_7"] = df.groupby(["store_id","product_id"])["sale_amount"].transform(lambda x: x.rolling(7).mean())
+    df["sales_ma_14"] = df.groupby(["store_id","product_id"])["sale_amount"].transform(lambda x: x.rolling(14).mean())
+    df = df.dropna(subset=["sales_lag_1","sales_ma_7","sales_ma_14"])
+    df["sales_next_7"] = df.groupby(["store_id","product_id"])["sale_amount"].shift(-7).rolling(7).sum()
+    df = df.dropna(subset=["sales_next_7"])
+
+    label_encoders = {}
+    for col in CATEGORICAL_COLS:
+        le = LabelEncoder()
+        df[col+"_enc"] = le.fit_transform(df[col])
+        label_encoders[col] = le
+    df["year"] = df["dt"].dt.year
+    df["month"] = df["dt"].dt.month
+    df["day"] = df["dt"].dt.day
+    df["day_of_week"] = df["dt"].dt.dayofweek
+    df["is_weekend"] = df["day_of_week"].isin([5,6]).astype(int)
+
+    X, y = df[FEATURES], df["sales_next_7"]
+    split_date = df["dt"].max() - pd.Timedelta(days=7)
+    train = df["dt"] <= split_date
+    return X[train], y[train], X[~train], y[~train], label_encoders
+
+
+def run_legacy(path, n_estimators, results):
+    start = time.perf_counter()
+    X_train, y_train, X_test, y_test, _ = legacy_frames(path)
+    model = xgb.XGBRegressor(n_estimators=n_estimators, learning_rate=0.1, max_depth=6, subsample=0.8,
+                             colsample_bytree=0.8, random_state=42, n_jobs=-1)
+    model.fit(X_train, y_train)
+    rmse = np.sqrt(mean_squared_error(y_test, model.predict(X_test)))
+    results.put((time.perf_counter() - start, peak_rss_mb(), rmse))
+
+
+def run_cached(path, cache_dir, n_estimators, batch_rows, results):
+    start = time.perf_counter()
+    cache = FeatureCache.load(cache_dir, path) or FeatureCache.build(path, cache_dir, batch_rows)
+    split_day = cache.split_day()
+    dtrain = xgb.QuantileDMatrix(CacheIter(cache, through=split_day, batch_rows=batch_rows), max_bin=256)
+    params = {"objective": "reg:squarederror", "tree_method": "hist", "learning_rate": 0.1, "max_depth": 6,
+              "subsample": 0.8, "colsample_bytree": 0.8, "seed": 42, "max_bin": 256}
+    booster = xgb.train(params, dtrain, num_boost_round=n_estimators)
+    sq, n = 0.0, 0
+    for X, y in cache.iter_rows(after=split_day, batch_rows=batch_rows):
+        sq += float(np.sum((y.astype(np.float64) - booster.inplace_predict(X)) ** 2))
+        n += len(y)
+    results.put((time.perf_counter() - start, peak_rss_mb(), np.sqrt(sq / n)))
+
+
+def in_process(target, *args):
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    p = ctx.Process(target=target, args=args + (results,))
+    p.start()
+    out = results.get()
+    p.join()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stores", type=int, default=100)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--batch-rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.parquet")
+        cache_dir = os.path.join(tmp, "train_cache")
+        write_frame(make_history(args.stores, args.products, args.days), path)
+
+        # Same training rows, labels and encoders as the original pipeline
+        X_train, y_train, X_test, _, encoders = legacy_frames(path)
+        cache = FeatureCache.build(path, cache_dir, args.batch_rows)
+        split_day = cache.split_day()
+        cached_X = np.concatenate([X for X, _ in cache.iter_rows(through=split_day, batch_rows=args.batch_rows)])
+        cached_y = np.concatenate([y for _, y in cache.iter_rows(through=split_day, batch_rows=args.batch_rows)])
+        same = (np.array_equal(cached_X, X_train.to_numpy(dtype=np.float32))
+                and np.array_equal(cached_y, y_train.to_numpy(dtype=np.float32))
+                and all(list(encoders[c].classes_) == cache.classes[c] for c in CATEGORICAL_COLS))
+        print(f"History rows: {len(read_frame(path, columns=['dt']))}, train rows: {len(X_train)}, "
+              f"test rows: {len(X_test)}, identical features/labels/encoders: {same}")
+
+        t, peak, rmse = in_process(run_legacy, path, args.n_estimators)
+        print(f"original pandas pipeline:      {t:7.1f}s  peak RSS {peak:7.0f} MB  RMSE {rmse:.4f}")
+        t, peak, rmse = in_process(run_cached, path, cache_dir + "_cold", args.n_estimators, args.batch_rows)
+        print(f"cached features, cold cache:   {t:7.1f}s  peak RSS {peak:7.0f} MB  RMSE {rmse:.4f}")
+        t, peak, rmse = in_process(run_cached, path, cache_dir, args.n_estimators, args.batch_rows)
+        print(f"cached features, warm cache:   {t:7.1f}s  peak RSS {peak:7.0f} MB  RMSE {rmse:.4f}")
+        if not same:
+            raise SystemExit("cached training rows differ from the original pipeline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# bench_what_if.py
+# Latency of on-demand single-store forecasts (web/what_if.py): building the
+# forecaster from a feature snapshot, a request that runs the model and a
+# repeat answered from the memo, against forecasting every series. Checks
+# that a request without overrides returns the store's rows of the full
+# forecast, and that an override changes them.
+#
+#   python benchmarks/bench_what_if.py --stores 200 --products 100 --days 30
+import argparse
+import time
+import warnings
+import joblib
+import numpy as np
+
+from common import make_history, timed
+from scripts.compact_forecast import widen_forecast
+from scripts.inference import load_backend
+from scripts.xgb_forecast import ENCODERS_PATH, encode_latest, forecast_batch, latest_features
+from web.what_if import WhatIfForecaster
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stores", type=int, default=200)
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    encoders = joblib.load(ENCODERS_PATH)
+    latest = latest_features(make_history(args.stores, args.products, args.days))
+    print(f"Series: {len(latest)}")
+
+    t_build, forecaster = timed(WhatIfForecaster, latest, encoders)
+    t_model, model = timed(load_backend)
+    t_full, full = timed(forecast_batch, model, encode_latest(latest, encoders))
+    full = widen_forecast(full)
+
+    store_ids = np.sort(latest["store_id"].unique())
+    for store_id in store_ids[:10]:
+        result = forecaster.forecast(store_id)
+        expected = full[full["store_id"] == store_id].astype(object).values.tolist()
+        if result["rows"] != expected:
+            raise SystemExit(f"what-if forecast of store {store_id} differs from the full forecast")
+    changed = forecaster.forecast(store_ids[0], overrides={"discount": 0.9, "activity_flag": 1})
+    if changed["rows"] == forecaster.forecast(store_ids[0])["rows"]:
+        raise SystemExit("overrides did not change the forecast")
+
+    rng = np.random.default_rng(0)
+    misses, hits = [], []
+    for i in range(args.requests):
+        store_id = int(rng.choice(store_ids))
+        overrides = {"discount": round(float(rng.random()), 2), "stock_hour6_22_cnt": int(rng.integers(0, 17))}
+        start = time.perf_counter()
+        miss = forecaster.forecast(store_id, overrides=overrides)
+        misses.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        hit = forecaster.forecast(store_id, overrides=overrides)
+        hits.append(time.perf_counter() - start)
+        assert hit["cached"] and not miss["cached"] and hit["rows"] == miss["rows"]
+
+    print(f"build forecaster: {t_build * 1000:.1f} ms, load model: {t_model * 1000:.1f} ms")
+    print(f"full forecast of {len(latest)} series: {t_full * 1000:.1f} ms")
+    for label, times in (("model run", misses), ("memo hit", hits)):
+        ms = np.array(times) * 1000
+        print(f"{label:<10} p50 {np.percentile(ms, 50):7.3f} ms  p95 {np.percentile(ms, 95):7.3f} ms")
+    print("no-override rows match the full forecast: True")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# common.py
+import contextlib
+import io
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+
+
+def make_history(n_stores=20, n_products=25, n_days=30, seed=42):
+    """Synthetic history with the schema of cleaned_retail_data_with_names.csv."""
+    rng = np.random.default_rng(seed)
+    cities = pd.read_csv(os.path.join(DATA_DIR, "cities.csv"))
+    stores = pd.read_csv(os.path.join(DATA_DIR, "stores.csv"))
+    products = pd.read_csv(os.path.join(DATA_DIR, "products.csv"))
+
+    store_ids = np.arange(n_stores)
+    product_ids = rng.choice(products["product_id"].max() + 1, size=n_products, replace=False)
+    dates = pd.date_range("2024-03-01", periods=n_days, freq="D")
+
+    grid = pd.MultiIndex.from_product([store_ids, product_ids, dates],
+                                      names=["store_id", "product_id", "dt"]).to_frame(index=False)
+    n = len(grid)
+    grid["city_id"] = (grid["store_id"] % len(cities)).astype(int)
+    grid["sale_amount"] = np.round(rng.gamma(2.0, 1.5, size=n), 2)
+    grid["stock_hour6_22_cnt"] = rng.integers(0, 20, size=n)
+    grid["discount"] = np.round(rng.uniform(0.5, 1.0, size=n), 2)
+    grid["holiday_flag"] = rng.integers(0, 2, size=n)
+    grid["activity_flag"] = rng.integers(0, 2, size=n)
+
+    df = grid.merge(cities, on="city_id", how="left")
+    df = df.merge(stores, on="store_id", how="left")
+    df["company_name"] = df["company_name"].fillna("Company_" + df["store_id"].astype(str))
+    df["branch_name"] = df["branch_name"].fillna("Branch_" + df["store_id"].astype(str))
+    df = df.merge(products, on="product_id", how="left")
+    df["product_name"] = df["product_name"].fillna("Product_" + df["product_id"].astype(str))
+
+    df["year"] = df["dt"].dt.year
+    df["month"] = df["dt"].dt.month
+    df["day"] = df["dt"].dt.day
+    df["day_of_week"] = df["dt"].dt.dayofweek
+    df["is_weekend"] = df["day_of_week"].isin([5,6]).astype(int)
+
+    df = df.sort_values(["store_id", "product_id", "dt"])
+    df["sales_lag_1"] = df.groupby(["store_id","product_id"])["sale_amount"].shift(1)
+    df["sales_ma_7"] = df.groupby(["store_id","product_id"])["sale_amount"].transform(lambda x: x.rolling(7).mean())
+    df = df.dropna(subset=["sales_lag_1","sales_ma_7"])
+
+    cols_order = [
+        "city_id","city_name",
+        "store_id","company_name","branch_name",
+        "product_id","product_name",
+        "dt","sale_amount","stock_hour6_22_cnt",
+        "discount","holiday_flag","activity_flag",
+        "year","month","day","day_of_week","is_weekend",
+        "sales_lag_1","sales_ma_7"
+    ]
+    return df[cols_order].reset_index(drop=True)
+
+
+RAW_COLUMNS = ["city_id","store_id","product_id","dt","sale_amount","stock_hour6_22_cnt",
+               "discount","holiday_flag","activity_flag"]
+
+
+def synthetic_shape(rows, days=90, max_products=865):
+    """
+    (stores, products per store) so stores * products * days covers `rows`:
+    about as many stores as products, up to FreshRetailNet's 865 products.
+    """
+    series = max(1, -(-rows // days))
+    products = int(min(max(1, round(np.sqrt(series))), max_products))
+    return -(-series // products), products
+
+
+def synthetic_raw_chunks(rows, days=90, seed=42, chunk_rows=1_000_000):
+    """
+    Raw daily rows with the schema of data/cleaned_retail_data.csv (the input
+    of loadclean.py), sorted by store, product and date, yielded a block of
+    whole stores at a time so memory stays flat at any scale. Each store is
+    drawn from its own seeded generator, so the data does not depend on
+    chunk_rows.
+    """
+    n_stores, n_products = synthetic_shape(rows, days)
+    n_cities = len(pd.read_csv(os.path.join(DATA_DIR, "cities.csv")))
+    dates = pd.date_range("2024-03-01", periods=days, freq="D")
+    holidays = np.random.default_rng([seed, 0]).random(days) < 0.05
+    weekend = np.isin(dates.dayofweek, [5, 6])
+    series_left = -(-rows // days)
+    stores_per_chunk = max(1, chunk_rows // (n_products * days))
+
+    for first in range(0, n_stores, stores_per_chunk):
+        frames = []
+        for store_id in range(first, min(first + stores_per_chunk, n_stores)):
+            k = min(n_products, series_left)
+            series_left -= k
+            if k <= 0:
+                break
+            rng = np.random.default_rng([seed, 1, store_id])
+            level = rng.gamma(2.0, 1.5, size=(k, 1))
+            shape = (k, days)
+            sales = level * (1 + 0.3 * weekend + 0.5 * holidays) * rng.gamma(4.0, 0.25, size=shape)
+            frames.append(pd.DataFrame({
+                "city_id": store_id % n_cities,
+                "store_id": store_id,
+                "product_id": np.repeat(np.arange(k), days),
+                "dt": np.tile(dates.strftime("%Y-%m-%d"), k),
+                "sale_amount": np.round(sales, 2).ravel(),
+                "stock_hour6_22_cnt": rng.poisson(level * 3 + 1, size=shape).ravel(),
+                "discount": np.round(rng.uniform(0.5, 1.0, size=k * days), 2),
+                "holiday_flag": np.tile(holidays.astype(int), k),
+                "activity_flag": (rng.random(k * days) < 0.2).astype(int),
+            }))
+        if frames:
+            yield pd.concat(frames, ignore_index=True)[RAW_COLUMNS]
+
+
+def write_synthetic_data(data_dir, rows, days=90, seed=42, with_names=False):
+    """
+    Write data_dir/cleaned_retail_data.csv plus the city/store/product
+    mappings; with_names also writes cleaned_retail_data_with_names.parquet
+    as loadclean.py would, chunk by chunk. Returns the number of raw rows.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from scripts import loadclean
+
+    os.makedirs(data_dir, exist_ok=True)
+    for name in ("cities.csv", "stores.csv", "products.csv"):
+        pd.read_csv(os.path.join(DATA_DIR, name)).to_csv(os.path.join(data_dir, name), index=False)
+    mappings = [pd.read_csv(os.path.join(data_dir, name)) for name in ("cities.csv", "stores.csv", "products.csv")]
+
+    raw_path = os.path.join(data_dir, "cleaned_retail_data.csv")
+    named_path = os.path.join(data_dir, "cleaned_retail_data_with_names.parquet")
+    n, writer = 0, None
+    try:
+        for i, chunk in enumerate(synthetic_raw_chunks(rows, days, seed)):
+            chunk.to_csv(raw_path, index=False, header=i == 0, mode="w" if i == 0 else "a")
+            n += len(chunk)
+            if with_names:
+                with contextlib.redirect_stdout(io.StringIO()):     # per-chunk "Missing ..." counts
+                    named = loadclean.enrich(chunk, *mappings)
+                named["sales_lag_1"], named["sales_ma_7"] = loadclean.lag_ma_features(named)
+                table = pa.Table.from_pandas(loadclean.finalize(named), preserve_index=False)
+                writer = writer or pq.ParquetWriter(named_path, table.schema)
+                writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n
+
+
+def timed(fn, *args, repeat=1, **kwargs):
+    """Run fn `repeat` times and return (best wall time in seconds, last result)."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
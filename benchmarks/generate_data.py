@@ -0,0 +1,30 @@
+# generate_data.py
+# Write a synthetic history at a chosen scale (50K to 50M rows): the raw
+# cleaned_retail_data.csv loadclean.py reads, the city/store/product mappings
+# and, with --with-names, cleaned_retail_data_with_names.parquet as well.
+#
+#   python benchmarks/generate_data.py --rows 5000000 --out /tmp/data-5m --with-names
+import argparse
+import time
+
+from common import synthetic_shape, write_synthetic_data
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", required=True, help="directory to write the data/ files into")
+    parser.add_argument("--with-names", action="store_true", help="also write the cleaned history with names")
+    args = parser.parse_args()
+
+    stores, products = synthetic_shape(args.rows, args.days)
+    start = time.perf_counter()
+    n = write_synthetic_data(args.out, args.rows, args.days, args.seed, args.with_names)
+    print(f"{n} rows ({stores} stores x {products} products x {args.days} days) "
+          f"written to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# run_suite.py
+# End-to-end benchmark suite on synthetic data at a chosen scale: loadclean
+# feature building, training, the 7-day forecast, the alert summaries and the
+# main Flask routes through the test client. Each benchmark runs in a fresh
+# process (so peak RSS is its own) inside a scratch copy of the data/ and
+# model/ layout, and the results go to JSON with the commit and machine they
+# came from.
+#
+#   python benchmarks/run_suite.py --rows 50000 --out results/base.json
+#   python benchmarks/run_suite.py --rows 5000000 --only forecast,routes --workdir /tmp/suite-5m
+#   python benchmarks/run_suite.py --compare results/base.json results/new.json --threshold 0.1
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from importlib import metadata
+import numpy as np
+
+from common import ROOT_DIR, timed, write_synthetic_data
+
+BENCHMARKS = ["loadclean", "train", "forecast", "summaries", "routes"]
+# Outputs a benchmark needs from earlier ones; those run first, unrecorded
+REQUIRES = {"train": ["loadclean"], "forecast": ["loadclean", "train"],
+            "summaries": ["loadclean", "train", "forecast"], "routes": ["loadclean", "train", "forecast"]}
+ROUTES = [
+    ("/", "login page"),
+    ("/get_branches_for_city?city=Bangalore", "branch lookup"),
+    ("/dashboard", "admin dashboard"),
+    ("/api/forecast?page=1&page_size=50", "forecast page 1"),
+    ("/api/forecast?page=20&page_size=50&alert=UNDERSTOCK&sort=city_name,branch_name", "alerts page 20"),
+    ("/api/forecast?page=1&page_size=50&sort=-day_1_forecast", "sorted page"),
+    ("/alerts", "alerts page"),
+    ("/download_forecast?format=csv", "csv export"),
+]
+COMPARED_SUFFIXES = ("seconds", "_ms", "peak_rss_mb")
+
+
+def vm_hwm_mb():
+    # VmHWM is reset on exec, unlike ru_maxrss which a spawned child inherits
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+# ---------------- Benchmarks (each runs in its own process, cwd = workdir) ----------------
+def bench_loadclean(args):
+    from scripts import loadclean
+    t_build, (df, _, checkpoint) = timed(loadclean.build)
+    t_save, _ = timed(loadclean.save, df, checkpoint=checkpoint)
+    return {"seconds": t_build, "save_seconds": t_save, "rows": len(df)}
+
+
+def bench_train(args):
+    from scripts import xgb_train
+    t, _ = timed(xgb_train.main, ["--rebuild-cache", "--n-estimators", str(args.n_estimators)])
+    with open(xgb_train.TRAIN_LOG_PATH) as f:
+        last = json.loads(f.read().splitlines()[-1])
+    return {"seconds": t, "train_seconds": last["train_seconds"], "rows": last["train_rows"], "rmse": last["rmse"]}
+
+
+def bench_forecast(args):
+    import joblib
+    import pandas as pd
+    from scripts import xgb_forecast
+    from scripts.inference import load_backend
+    from scripts.storage import read_frame, resolve
+
+    def load():
+        df = read_frame(resolve(xgb_forecast.CLEANED_PATH))
+        df["dt"] = pd.to_datetime(df["dt"])
+        return df
+
+    t_load, df = timed(load)
+    label_encoders = joblib.load(xgb_forecast.ENCODERS_PATH)
+    t_features, latest_df = timed(xgb_forecast.build_latest, df, label_encoders)
+    model = load_backend()
+    t_predict, forecast_df = timed(xgb_forecast.forecast_batch, model, latest_df, repeat=args.repeat)
+    t_save, csv_view = timed(xgb_forecast.save_forecast, forecast_df)
+    xgb_forecast.publish_views(csv_view)
+    return {"seconds": t_load + t_features + t_predict + t_save, "load_seconds": t_load,
+            "features_seconds": t_features, "predict_seconds": t_predict, "save_seconds": t_save,
+            "series": len(latest_df), "series_per_second": len(latest_df) / t_predict}
+
+
+def bench_summaries(args):
+    from scripts.alerts_summary import compute_alerts_summary, compute_all_summaries
+    from scripts.storage import read_frame, resolve
+    from scripts.xgb_forecast import FORECAST_PATH
+    fc = read_frame(resolve(FORECAST_PATH))
+    city, branch = fc["city_name"].iloc[0], fc["branch_name"].iloc[0]
+    t_admin, _ = timed(compute_alerts_summary, fc, repeat=args.repeat)
+    t_scope, _ = timed(compute_alerts_summary, fc, city, branch, repeat=args.repeat)
+    t_all, summaries = timed(compute_all_summaries, fc, repeat=args.repeat)
+    return {"seconds": t_all, "admin_seconds": t_admin, "scope_seconds": t_scope,
+            "scopes": len(summaries), "rows": len(fc)}
+
+
+def bench_routes(args):
+    import warnings
+    warnings.filterwarnings("ignore")
+    os.environ.pop("DATABASE_URL", None)
+    from web.app import app
+
+    client = app.test_client()
+    client.post("/", data={"role": "admin", "username": "admin", "password": "admin123"})
+    start = time.perf_counter()
+    client.get("/dashboard")      # first request loads and indexes the data
+    out = {"cold_dashboard_ms": (time.perf_counter() - start) * 1e3}
+    total = 0.0
+    for url, name in ROUTES:
+        samples = []
+        for _ in range(args.route_repeat):
+            start = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            samples.append((time.perf_counter() - start) * 1e3)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{url} returned {response.status_code}")
+        key = name.replace(" ", "_")
+        out[f"{key}_p50_ms"] = float(np.median(samples))
+        out[f"{key}_p95_ms"] = float(np.percentile(samples, 95))
+        total += float(np.median(samples)) / 1e3
+    out["seconds"] = total
+    return out
+
+
+BENCH_FUNCTIONS = {name: globals()[f"bench_{name}"] for name in BENCHMARKS}
+
+
+def _child(name, args, workdir, results):
+    os.chdir(workdir)
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            out = BENCH_FUNCTIONS[name](args)
+        out["peak_rss_mb"] = vm_hwm_mb()
+        results.put(("ok", out))
+    except Exception as e:
+        results.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def run_isolated(name, args, workdir):
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    p = ctx.Process(target=_child, args=(name, args, workdir, results))
+    p.start()
+    status, out = results.get()
+    p.join()
+    if status != "ok":
+        raise SystemExit(f"benchmark {name} failed: {out}")
+    return out
+
+
+# ---------------- Data, metadata, comparison ----------------
+def prepare_data(workdir, args):
+    """Generate the synthetic raw history in workdir/data, unless the same one is already there."""
+    marker = os.path.join(workdir, "suite_data.json")
+    spec = {"rows": args.rows, "days": args.days, "seed": args.seed}
+    try:
+        with open(marker) as f:
+            if json.load(f) == spec:
+                return None
+    except (OSError, ValueError):
+        pass
+    os.makedirs(os.path.join(workdir, "model"), exist_ok=True)
+    start = time.perf_counter()
+    write_synthetic_data(os.path.join(workdir, "data"), args.rows, args.days, args.seed)
+    with open(marker, "w") as f:
+        json.dump(spec, f)
+    return time.perf_counter() - start
+
+
+def machine_info():
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], cwd=ROOT_DIR, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    cpu = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpu = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu)
+    except OSError:
+        pass
+    versions = {}
+    for pkg in ("pandas", "numpy", "pyarrow", "xgboost", "scikit-learn", "Flask"):
+        try:
+            versions[pkg] = metadata.version(pkg)
+        except metadata.PackageNotFoundError:
+            versions[pkg] = None
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu": cpu,
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
+
+
+def compare(base_path, new_path, threshold):
+    """Print new/base ratios of every timing and memory figure; exit 1 on a regression."""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"base: {base['meta']['commit']} ({base['meta']['rows']} rows)  "
+          f"new: {new['meta']['commit']} ({new['meta']['rows']} rows)")
+    if base["meta"]["rows"] != new["meta"]["rows"]:
+        print("warning: the two runs used different data sizes")
+    regressions = 0
+    print(f"{'benchmark':<12}{'metric':<32}{'base':>12}{'new':>12}{'ratio':>8}")
+    for name, results in new["results"].items():
+        for metric, value in results.items():
+            old = base["results"].get(name, {}).get(metric)
+            if old is None or not metric.endswith(COMPARED_SUFFIXES) or not old:
+                continue
+            ratio = value / old
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            elif ratio < 1 - threshold:
+                flag = "  improved"
+            print(f"{name:<12}{metric:<32}{old:12.4g}{value:12.4g}{ratio:8.2f}{flag}")
+    if regressions:
+        raise SystemExit(f"{regressions} figure(s) more than {threshold:.0%} worse")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000, help="synthetic history rows (50K to 50M)")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", help=f"comma-separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3, help="repeats of the in-process timings (best is kept)")
+    parser.add_argument("--route-repeat", type=int, default=20, help="requests per route")
+    parser.add_argument("--workdir", help="keep data and outputs here (reused when rows/days/seed match)")
+    parser.add_argument("--out", help="JSON results path (default: print only)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown counted as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare, args.threshold)
+        return
+
+    selected = args.only.split(",") if args.only else BENCHMARKS
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    needed = {dep for name in selected for dep in REQUIRES.get(name, [])} | set(selected)
+
+    with contextlib.ExitStack() as stack:
+        workdir = args.workdir or stack.enter_context(tempfile.TemporaryDirectory())
+        workdir = os.path.abspath(workdir)
+        t_gen = prepare_data(workdir, args)
+        print(f"Data: {args.rows} rows in {workdir}" + (f" (generated in {t_gen:.1f}s)" if t_gen else " (reused)"))
+
+        results = {}
+        for name in BENCHMARKS:
+            if name not in needed:
+                continue
+            out = run_isolated(name, args, workdir)
+            if name not in selected:
+                print(f"{name:<12} (setup) {out['seconds']:8.2f}s")
+                continue
+            results[name] = out
+            print(f"{name:<12} {out['seconds']:8.2f}s  peak RSS {out['peak_rss_mb']:7.0f} MB")
+            for k, v in out.items():
+                if k not in ("seconds", "peak_rss_mb"):
+                    print(f"    {k:<28}{v:12.4g}")
+
+    report = {
+        "meta": dict(machine_info(), rows=args.rows, days=args.days, seed=args.seed,
+                     n_estimators=args.n_estimators, at=datetime.now().isoformat(timespec="seconds")),
+        "results": results,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
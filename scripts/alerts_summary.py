@@ -0,0 +1,116 @@
+# alerts_summary.py
+import os
+import numpy as np
+import pandas as pd
+import joblib
+
+SUMMARY_PATH = "data/alert_summaries.pkl"
+ADMIN_SCOPE = (None, None)
+REORDER_COLS = ["store_id","product_id","city_name","branch_name","product_name","stock_hour6_22_cnt"]
+
+
+def prepare_alerts(df):
+    """
+    (understock, overstock, reorder): row-level alert masks and reorder
+    quantities computed once over the whole frame. Also used by
+    scripts/repository.py to publish the same values to the database.
+    """
+    alert_cols = [c for c in df.columns if c.endswith("_alert")]
+    forecast_cols = [c for c in df.columns if c.startswith("day_") and c.endswith("_forecast")]
+
+    alerts = df[alert_cols].to_numpy()
+    understock = (alerts == "UNDERSTOCK").any(axis=1)
+    overstock = (alerts == "OVERSTOCK").any(axis=1)
+
+    # max(0, round(max(forecast) - stock, 2)); NaN rows need no reorder
+    future_max = df[forecast_cols].to_numpy(dtype=np.float64).max(axis=1)
+    stock = df["stock_hour6_22_cnt"].to_numpy(dtype=np.float64)
+    reorder = np.round(future_max - stock, 2)
+    reorder = np.where(reorder > 0, reorder, 0.0)
+    return understock, overstock, reorder
+
+
+def _count_by(values, name):
+    """groupby(name).size() over an object array, via sorted factorize codes."""
+    codes, uniques = pd.factorize(values, sort=True)
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    keep = counts > 0
+    return pd.Series(counts[keep], index=pd.Index(uniques[keep], name=name))
+
+
+def _count_by_pair(first, second, names):
+    """groupby([first, second]).size() over two object arrays."""
+    c1, u1 = pd.factorize(first, sort=True)
+    c2, u2 = pd.factorize(second, sort=True)
+    valid = (c1 >= 0) & (c2 >= 0)
+    pair = c1[valid].astype(np.int64) * len(u2) + c2[valid]
+    keys, counts = np.unique(pair, return_counts=True)
+    index = pd.MultiIndex.from_arrays([u1[keys // len(u2)], u2[keys % len(u2)]], names=names)
+    return pd.Series(counts, index=index)
+
+
+def _summarize(df, rows, understock, overstock, reorder):
+    """Summary for the rows at positions `rows` (None for the whole frame)."""
+    if rows is None:
+        rows = np.arange(len(df))
+    under_rows = rows[understock[rows]]
+
+    product_names = df["product_name"].to_numpy()[under_rows]
+    top_under_products = _count_by(product_names, "product_name").sort_values(ascending=False).head(10)
+    top_under_stores = _count_by_pair(df["city_name"].to_numpy()[under_rows],
+                                      df["branch_name"].to_numpy()[under_rows],
+                                      ["city_name","branch_name"]).sort_values(ascending=False).head(10)
+
+    reorder_rows = rows[reorder[rows] > 0]
+    reorder_list = df.iloc[reorder_rows][REORDER_COLS].assign(reorder_qty=reorder[reorder_rows])
+    reorder_list = reorder_list.sort_values("reorder_qty", ascending=False).head(20)
+
+    return {
+        "total_rows": len(rows),
+        "total_understock": len(under_rows),
+        "total_overstock": int(overstock[rows].sum()),
+        "top_under_products": top_under_products.reset_index().values.tolist(),
+        "top_under_stores": top_under_stores.reset_index().values.tolist(),
+        "reorder_list": reorder_list.to_dict(orient="records")
+    }
+
+
+def compute_alerts_summary(forecast_df, filter_city=None, filter_branch=None):
+    if forecast_df.empty:
+        return {}
+    mask = np.ones(len(forecast_df), dtype=bool)
+    if filter_city:
+        mask &= (forecast_df["city_name"] == filter_city).to_numpy()
+    if filter_branch:
+        mask &= (forecast_df["branch_name"] == filter_branch).to_numpy()
+    return _summarize(forecast_df, np.flatnonzero(mask), *prepare_alerts(forecast_df))
+
+
+def compute_all_summaries(forecast_df):
+    """
+    Admin summary plus one per (city_name, branch_name) manager scope, keyed by
+    scope tuple with ADMIN_SCOPE for the admin view.
+    """
+    if forecast_df.empty:
+        return {}
+    prepared = prepare_alerts(forecast_df)
+    summaries = {ADMIN_SCOPE: _summarize(forecast_df, None, *prepared)}
+    scopes = forecast_df.groupby(["city_name","branch_name"], sort=False, observed=True).indices
+    for scope, rows in scopes.items():
+        summaries[scope] = _summarize(forecast_df, rows, *prepared)
+    return summaries
+
+
+def save_summaries(summaries, path=SUMMARY_PATH):
+    tmp_path = path + ".tmp"
+    joblib.dump(summaries, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_summaries(path, forecast_path):
+    """Stored summaries, or None if missing or older than the forecast file."""
+    if not os.path.exists(path) or not os.path.exists(forecast_path):
+        return None
+    if os.path.getmtime(path) < os.path.getmtime(forecast_path):
+        return None
+    return joblib.load(path)
@@ -0,0 +1,271 @@
+# bulk_loader.py
+import os
+import csv
+import time
+import sqlite3
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+TABLE = "retail_data"
+COLUMNS = [
+    "city_id", "store_id", "product_id", "dt", "sale_amount",
+    "stock_hour6_22_cnt", "discount", "holiday_flag", "activity_flag"
+]
+KEY_COLUMNS = ["store_id", "product_id", "dt"]
+# ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT: the transaction was rolled back (or
+# gave up) because of another writer, and the same statements may succeed on retry
+MYSQL_RETRY_ERRNOS = (1213, 1205)
+
+
+def iter_chunks(source, chunk_rows=50000, columns=COLUMNS):
+    """
+    DataFrame chunks of `columns` from a DataFrame, a pyarrow Table or any
+    iterable of DataFrames, without materializing the whole source at once.
+    """
+    if isinstance(source, pd.DataFrame):
+        for i in range(0, len(source), chunk_rows):
+            yield source.iloc[i:i + chunk_rows][columns]
+    elif hasattr(source, "to_batches"):
+        for batch in source.select(columns).to_batches(max_chunksize=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        for chunk in source:
+            yield chunk[columns]
+
+
+def to_rows(chunk):
+    """Native-Python row tuples with NaN as None, converted column-wise."""
+    chunk = chunk.copy()
+    chunk["dt"] = pd.to_datetime(chunk["dt"]).dt.strftime("%Y-%m-%d")
+    return list(chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None))
+
+
+class _Dialect(ABC):
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns
+
+    @abstractmethod
+    def upsert_sql(self, n_rows):
+        """Multi-row upsert statement for `n_rows` rows."""
+
+    @abstractmethod
+    def ensure_schema(self, conn):
+        """Create the table or add the unique key the upserts rely on."""
+
+    @abstractmethod
+    def load_data_sql(self, path):
+        """Bulk load statement for a CSV file."""
+
+    def is_retryable(self, exc):
+        """Whether a failed chunk lost a lock conflict and may be sent again."""
+        return False
+
+
+class MySQLDialect(_Dialect):
+    def upsert_sql(self, n_rows):
+        row = "(" + ", ".join(["%s"] * len(self.columns)) + ")"
+        updates = ", ".join(f"{c} = VALUES({c})" for c in self.columns if c not in KEY_COLUMNS)
+        return (f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES "
+                + ", ".join([row] * n_rows) + f" ON DUPLICATE KEY UPDATE {updates}")
+
+    def _drop_duplicates(self, cursor):
+        """
+        Tables filled by the old plain-INSERT loader can hold several rows per
+        key, which would make adding the unique key fail. With an
+        auto-increment id the newest row (highest id) per key is kept; without
+        one "newest" is unknown, so the operator has to choose.
+        """
+        keys = ", ".join(KEY_COLUMNS)
+        cursor.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {self.table} GROUP BY {keys} "
+                       "HAVING COUNT(*) > 1) AS dup")
+        n_keys = cursor.fetchone()[0]
+        if not n_keys:
+            return
+        cursor.execute("SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+                       "AND TABLE_NAME = %s AND EXTRA LIKE %s", (self.table, "%auto_increment%"))
+        id_col = cursor.fetchone()
+        if id_col is None:
+            raise RuntimeError(
+                f"{self.table} has {n_keys} ({keys}) keys with duplicate rows, so the unique key "
+                f"uq_store_product_dt cannot be added. Delete the extra rows (keep one per key) "
+                f"and run the loader again.")
+        id_col = id_col[0]
+        same_key = " AND ".join(f"a.{c} = b.{c}" for c in KEY_COLUMNS)
+        cursor.execute(f"DELETE a FROM {self.table} a JOIN {self.table} b ON {same_key} AND a.{id_col} < b.{id_col}")
+        print(f"Removed {cursor.rowcount} duplicate rows from {self.table}, keeping the newest per key")
+
+    def ensure_schema(self, conn):
+        cursor = conn.cursor()
+        cursor.execute(f"SHOW INDEX FROM {self.table} WHERE Key_name = 'uq_store_product_dt'")
+        if not cursor.fetchall():
+            self._drop_duplicates(cursor)
+            cursor.execute(f"ALTER TABLE {self.table} ADD UNIQUE KEY uq_store_product_dt ({', '.join(KEY_COLUMNS)})")
+        cursor.close()
+        conn.commit()
+
+    def load_data_sql(self, path):
+        # REPLACE makes LOAD DATA an upsert on the unique key
+        return (f"LOAD DATA LOCAL INFILE '{path}' REPLACE INTO TABLE {self.table} "
+                "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n' "
+                f"({', '.join(self.columns)})")
+
+    def is_retryable(self, exc):
+        return getattr(exc, "errno", None) in MYSQL_RETRY_ERRNOS
+
+
+class SQLiteDialect(_Dialect):
+    def upsert_sql(self, n_rows):
+        row = "(" + ", ".join(["?"] * len(self.columns)) + ")"
+        updates = ", ".join(f"{c} = excluded.{c}" for c in self.columns if c not in KEY_COLUMNS)
+        return (f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES "
+                + ", ".join([row] * n_rows) + f" ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO UPDATE SET {updates}")
+
+    def ensure_schema(self, conn):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                city_id INTEGER, store_id INTEGER, product_id INTEGER, dt TEXT,
+                sale_amount REAL, stock_hour6_22_cnt REAL, discount REAL,
+                holiday_flag INTEGER, activity_flag INTEGER
+            )""")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_store_product_dt ON {self.table} ({', '.join(KEY_COLUMNS)})")
+        conn.commit()
+
+    def load_data_sql(self, path):
+        raise ValueError("LOAD DATA LOCAL INFILE needs MySQL/MariaDB; use method='insert' with SQLite")
+
+    def is_retryable(self, exc):
+        return isinstance(exc, sqlite3.OperationalError) and "locked" in str(exc)
+
+
+def mysql_connect(**config):
+    import mysql.connector
+    return mysql.connector.connect(allow_local_infile=True, **config)
+
+
+def sqlite_connect(path):
+    return sqlite3.connect(path, timeout=60, check_same_thread=False)
+
+
+class BulkLoader:
+    """
+    Streams chunks into `table` over `workers` parallel connections, upserting
+    on (store_id, product_id, dt) so re-running an ingest never duplicates rows.
+
+    method="insert" sends multi-row INSERT ... ON DUPLICATE KEY UPDATE (or
+    ON CONFLICT for SQLite) statements of `rows_per_statement` rows;
+    method="load_data" writes each chunk to a temp CSV and runs
+    LOAD DATA LOCAL INFILE ... REPLACE (MySQL/MariaDB only).
+
+    A chunk is one transaction. If it fails the transaction is rolled back;
+    on a deadlock or lock wait timeout it is retried up to `retries` times,
+    otherwise the load stops and the error is raised.
+    """
+
+    def __init__(self, connect, dialect="mysql", method="insert", workers=4,
+                 rows_per_statement=1000, table=TABLE, columns=COLUMNS, retries=3, retry_delay=0.5):
+        self.connect = connect
+        self.dialect = (SQLiteDialect if dialect == "sqlite" else MySQLDialect)(table, columns)
+        self.method = method
+        self.workers = workers
+        self.rows_per_statement = rows_per_statement
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._local = threading.local()
+        self._conns = []
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def _insert(self, chunk):
+        conn = self._conn()
+        cursor = conn.cursor()
+        rows = to_rows(chunk)
+        for i in range(0, len(rows), self.rows_per_statement):
+            batch = rows[i:i + self.rows_per_statement]
+            cursor.execute(self.dialect.upsert_sql(len(batch)), [v for row in batch for v in row])
+        conn.commit()
+        cursor.close()
+        return len(rows)
+
+    def _load_data(self, chunk):
+        conn = self._conn()
+        chunk = chunk.copy()
+        chunk["dt"] = pd.to_datetime(chunk["dt"]).dt.strftime("%Y-%m-%d")
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        try:
+            with os.fdopen(fd, "w", newline="") as f:
+                chunk.to_csv(f, index=False, header=False, na_rep="\\N", quoting=csv.QUOTE_MINIMAL)
+            cursor = conn.cursor()
+            cursor.execute(self.dialect.load_data_sql(path))
+            conn.commit()
+            cursor.close()
+        finally:
+            os.remove(path)
+        return len(chunk)
+
+    def _attempt(self, work, chunk):
+        for attempt in range(self.retries + 1):
+            try:
+                return work(chunk)
+            except Exception as e:
+                try:
+                    self._conn().rollback()
+                except Exception:
+                    pass
+                if attempt == self.retries or not self.dialect.is_retryable(e):
+                    raise
+                print(f"Retrying chunk after {e}")
+                time.sleep(self.retry_delay * 2 ** attempt)
+
+    def load(self, chunks):
+        """Load every chunk; returns (rows, seconds, rows_per_sec)."""
+        setup = self.connect()
+        try:
+            self.dialect.ensure_schema(setup)
+        finally:
+            setup.close()
+
+        work = self._load_data if self.method == "load_data" else self._insert
+        start = time.perf_counter()
+        total = 0
+        # Bound in-flight chunks so memory stays at a few chunks whatever the source size
+        slots = threading.BoundedSemaphore(self.workers * 2)
+
+        def run(chunk):
+            try:
+                return self._attempt(work, chunk)
+            finally:
+                slots.release()
+
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            futures = []
+            for chunk in chunks:
+                slots.acquire()
+                futures.append(pool.submit(run, chunk))
+                done = [f for f in futures if f.done()]
+                for f in done:
+                    total += f.result()
+                    futures.remove(f)
+            for f in futures:
+                total += f.result()
+        finally:
+            # On a failed chunk drop the queued ones, let the running ones
+            # finish, then close every worker connection
+            pool.shutdown(wait=True, cancel_futures=True)
+            for conn in self._conns:
+                conn.close()
+            self._conns = []
+            self._local = threading.local()
+        seconds = time.perf_counter() - start
+        return total, seconds, total / seconds if seconds else float("inf")
@@ -0,0 +1,147 @@
+# compact_forecast.py
+import os
+import re
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+COMPACT_EXT = ".arrow"
+ALERT_LABELS = ["OK", "OVERSTOCK", "UNDERSTOCK"]
+ID_COLS = ["city_id","store_id","product_id"]
+FORECAST_DECIMALS = 2
+
+_FORECAST_COL = re.compile(r"day_(\d+)_forecast$")
+_ALERT_COL = re.compile(r"day_(\d+)_alert$")
+
+
+def compact_path(path):
+    """data/x.csv -> data/x.arrow"""
+    return os.path.splitext(path)[0] + COMPACT_EXT
+
+
+def _code_dtype(n_categories):
+    # The narrowest dtype pandas keeps Categorical codes in, so from_codes() never copies
+    if n_categories < np.iinfo(np.int8).max:
+        return np.int8
+    if n_categories < np.iinfo(np.int16).max:
+        return np.int16
+    return np.int32
+
+
+def _encode(s):
+    """Codes (-1 for missing) and sorted category labels for a string or categorical column."""
+    codes, uniques = pd.factorize(s, sort=True)
+    return codes.astype(_code_dtype(len(uniques))), [str(u) for u in uniques]
+
+
+def widen_forecast(df):
+    """float32 forecast columns back to the float64 values written to the CSV."""
+    narrow = [c for c in df.columns if _FORECAST_COL.match(c) and df[c].dtype == np.float32]
+    if not narrow:
+        return df
+    return df.assign(**{c: np.round(df[c].to_numpy(dtype=np.float64), FORECAST_DECIMALS) for c in narrow})
+
+
+class CompactForecast:
+    """
+    The forecast table as a float32 (n_series x days) forecast matrix, an int8
+    (n_series x days) alert-code matrix, integer-coded name columns and narrow
+    ID columns, stored in one uncompressed Arrow IPC file.
+
+    open() memory-maps the file, so every gunicorn worker reading the same
+    version shares one copy of the pages through the OS page cache, and
+    frame() wraps those buffers in a DataFrame without copying them: name and
+    alert columns are Categoricals over the stored codes and each
+    day_N_forecast column is a strided view into the matrix. The arrays are
+    read-only; replace the file (write() renames into place) to publish a new
+    version.
+    """
+
+    def __init__(self, columns, arrays, forecast, alerts, categories):
+        self.columns = columns          # original column order
+        self.arrays = arrays            # name -> 1-D ndarray (IDs, stock, name codes)
+        self.forecast = forecast        # float32 (n, days)
+        self.alerts = alerts            # int8 (n, days), codes into ALERT_LABELS, -1 missing
+        self.categories = categories    # name column -> labels
+
+    def __len__(self):
+        return len(self.forecast)
+
+    @classmethod
+    def from_frame(cls, df):
+        forecast_cols = sorted((c for c in df.columns if _FORECAST_COL.match(c)),
+                               key=lambda c: int(_FORECAST_COL.match(c).group(1)))
+        alert_cols = sorted((c for c in df.columns if _ALERT_COL.match(c)),
+                            key=lambda c: int(_ALERT_COL.match(c).group(1)))
+
+        forecast = np.round(df[forecast_cols].to_numpy(dtype=np.float64), FORECAST_DECIMALS).astype(np.float32)
+        alerts = np.full((len(df), len(alert_cols)), -1, dtype=np.int8)
+        for d, col in enumerate(alert_cols):
+            for code, label in enumerate(ALERT_LABELS):
+                alerts[(df[col] == label).to_numpy(), d] = code
+
+        arrays, categories = {}, {}
+        for col in df.columns:
+            if col in forecast_cols or col in alert_cols:
+                continue
+            s = df[col]
+            if col in ID_COLS and pd.api.types.is_integer_dtype(s.dtype):
+                arrays[col] = s.to_numpy(dtype=np.int32)
+            elif pd.api.types.is_numeric_dtype(s.dtype):
+                arrays[col] = s.to_numpy()
+            else:
+                arrays[col], categories[col] = _encode(s)
+        return cls(list(df.columns), arrays, forecast, alerts, categories)
+
+    def write(self, path):
+        """Uncompressed Arrow IPC (so it can be memory-mapped), written via a temp file."""
+        n, days = self.forecast.shape
+        fields = {name: pa.array(values) for name, values in self.arrays.items()}
+        fields["_forecast"] = pa.FixedSizeListArray.from_arrays(pa.array(self.forecast.ravel()), days)
+        fields["_alerts"] = pa.FixedSizeListArray.from_arrays(pa.array(self.alerts.ravel()), days)
+        table = pa.table(fields).replace_schema_metadata({
+            "columns": json.dumps(self.columns),
+            "categories": json.dumps(self.categories),
+        })
+        tmp_path = path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=max(n, 1))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a file written by write(); no array data is copied."""
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        meta = table.schema.metadata
+        columns = json.loads(meta[b"columns"])
+        categories = json.loads(meta[b"categories"])
+
+        def chunk(name):
+            col = table.column(name)
+            return col.chunk(0) if col.num_chunks else pa.array([], type=col.type)
+
+        arrays = {name: chunk(name).to_numpy(zero_copy_only=True)
+                  for name in table.column_names if not name.startswith("_")}
+        days = table.schema.field("_forecast").type.list_size
+        forecast = chunk("_forecast").flatten().to_numpy(zero_copy_only=True).reshape(-1, days)
+        alerts = chunk("_alerts").flatten().to_numpy(zero_copy_only=True).reshape(-1, days)
+        return cls(columns, arrays, forecast, alerts, categories)
+
+    def column(self, name):
+        """One column as a view: ndarray, or Categorical over the stored codes."""
+        m = _FORECAST_COL.match(name)
+        if m:
+            return self.forecast[:, int(m.group(1)) - 1]
+        m = _ALERT_COL.match(name)
+        if m:
+            return pd.Categorical.from_codes(self.alerts[:, int(m.group(1)) - 1], ALERT_LABELS, validate=False)
+        if name in self.categories:
+            return pd.Categorical.from_codes(self.arrays[name], self.categories[name], validate=False)
+        return self.arrays[name]
+
+    def frame(self, columns=None):
+        """DataFrame over the stored buffers in the original column layout, without copying."""
+        columns = columns or self.columns
+        return pd.DataFrame({c: self.column(c) for c in columns}, copy=False)
@@ -1,25 +1,125 @@
 import os
+import sys
+import argparse
+import joblib
 import pandas as pd
-import subprocess
 from datetime import datetime
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts import loadclean, xgb_forecast, xgb_train
+from scripts.alerts_summary import SUMMARY_PATH
+from scripts.compact_forecast import compact_path
+from scripts.inference import BACKENDS, DEFAULT_BACKEND, MODEL_PATH, booster_path, load_backend
+from scripts.pipeline import Pipeline, Stage, print_report
+from scripts.storage import columnar_path, read_frame, write_frame
+
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+MAPPING_PATHS = ["data/cities.csv", "data/stores.csv", "data/products.csv"]
+FORECAST_OUTPUTS = [xgb_forecast.FORECAST_PATH, columnar_path(xgb_forecast.FORECAST_PATH),
+                    compact_path(xgb_forecast.FORECAST_PATH)]
+
+
+def code(*names):
+    return [os.path.join(BASE_DIR, name) for name in names]
+
+
+def build_stages(args):
+    """clean -> features -> (train) -> forecast -> summaries"""
+
+    # 1️⃣ Append the new day to cleaned data with names
+    def clean(ctx):
+        df, incremental, checkpoint = loadclean.build(incremental=not args.full_clean)
+        loadclean.save(df, incremental, checkpoint)
+        return df
+
+    def load_clean(ctx):
+        df = read_frame(loadclean.OUTPUT_PATH)
+        df["dt"] = pd.to_datetime(df["dt"])
+        return df
+
+    # 2️⃣ Lag, moving-average and date features at each series' latest day
+    def features(ctx):
+        latest_df = xgb_forecast.latest_features(ctx.get("clean"))
+        write_frame(latest_df, xgb_forecast.LATEST_FEATURES_PATH)
+        return latest_df
+
+    # 3️⃣ A few boosting rounds on the new days, kept only if the holdout RMSE
+    # does not get worse; a full rebuild runs weekly or when labels change
+    def train(ctx):
+        xgb_train.main(["--incremental"])
+
+    # 4️⃣ 7-day stock forecast
+    def forecast(ctx):
+        latest_df = xgb_forecast.encode_latest(ctx.get("features"), joblib.load(xgb_forecast.ENCODERS_PATH))
+        if args.workers > 1:
+            forecast_df = xgb_forecast.forecast_parallel(latest_df, MODEL_PATH, args.workers,
+                                                         backend=args.backend)
+        else:
+            forecast_df = xgb_forecast.forecast_batch(load_backend(args.backend), latest_df)
+        return xgb_forecast.save_forecast(forecast_df)
+
+    # 5️⃣ Dashboard summaries and the database copy
+    def summaries(ctx):
+        xgb_forecast.publish_views(ctx.get("forecast"))
+
+    stages = [
+        Stage("clean", clean, load=load_clean,
+              inputs=[loadclean.RAW_PATH] + MAPPING_PATHS,
+              outputs=[loadclean.OUTPUT_PATH, loadclean.CHECKPOINT_PATH],
+              code=code("loadclean.py", "features.py")),
+        Stage("features", features, load=lambda ctx: read_frame(xgb_forecast.LATEST_FEATURES_PATH),
+              deps=["clean"], outputs=[xgb_forecast.LATEST_FEATURES_PATH],
+              code=code("xgb_forecast.py", "features.py")),
+    ]
+    if not args.no_train:
+        stages.append(Stage("train", train, deps=["clean"],
+                            outputs=[MODEL_PATH, booster_path(MODEL_PATH), xgb_forecast.ENCODERS_PATH],
+                            code=code("xgb_train.py", "train_cache.py")))
+    stages += [
+        Stage("forecast", forecast, load=lambda ctx: read_frame(columnar_path(xgb_forecast.FORECAST_PATH)),
+              deps=["features"], inputs=[MODEL_PATH, booster_path(MODEL_PATH), xgb_forecast.ENCODERS_PATH],
+              outputs=FORECAST_OUTPUTS, code=code("xgb_forecast.py", "inference.py", "compact_forecast.py"),
+              params={"backend": args.backend}),
+        Stage("summaries", summaries, deps=["forecast"], outputs=[SUMMARY_PATH],
+              code=code("alerts_summary.py")),
+    ]
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily pipeline: clean, features, train, forecast, summaries.")
+    parser.add_argument("--full-clean", action="store_true", help="rebuild the cleaned history instead of appending")
+    parser.add_argument("--no-train", action="store_true", help="forecast with the current model")
+    parser.add_argument("--only", help="comma-separated stages to rerun; the others are left as they are")
+    parser.add_argument("--from", dest="from_stage", help="rerun this stage and every stage after it")
+    parser.add_argument("--force", action="store_true", help="rerun every stage even if its inputs are unchanged")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("FORECAST_WORKERS", 1)),
+                        help="forecast worker processes (default: $FORECAST_WORKERS or 1)")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.environ.get("FORECAST_BACKEND", DEFAULT_BACKEND))
+    args = parser.parse_args()
 
-print(f"[{datetime.now()}] Starting daily forecast pipeline...")
+    pipeline = Pipeline(build_stages(args))
+    names = list(pipeline.stages)
+    for name in filter(None, [args.from_stage] + (args.only or "").split(",")):
+        if name not in names:
+            parser.error(f"unknown stage {name!r} (stages: {', '.join(names)})")
 
-# 1️⃣ Run loadclean.py to refresh cleaned data with names
-print("Step 1: Cleaning data...")
-subprocess.run(["python", os.path.join(BASE_DIR, "loadclean.py")], check=True)
+    selected, force = None, set()
+    if args.only:
+        selected = force = set(args.only.split(","))
+    elif args.from_stage:
+        force = set(names[names.index(args.from_stage):])
+    elif args.force:
+        force = set(names)
 
-# 2️⃣ Optional: retrain model if you want daily retraining
-# Uncomment below if you want to retrain every day
-# print("Step 2: Training XGBoost model...")
-# subprocess.run(["python", os.path.join(BASE_DIR, "xgb_train.py")], check=True)
+    print(f"[{datetime.now()}] Starting daily forecast pipeline...")
+    print_report(pipeline.run(selected, force))
+    print(f"[{datetime.now()}] Daily forecast pipeline completed!")
 
-# 3️⃣ Run forecast
-print("Step 3: Running 7-day stock forecast...")
-subprocess.run(["python", os.path.join(BASE_DIR, "xgb_forecast.py")], check=True)
 
-print(f"[{datetime.now()}] Daily forecast pipeline completed!")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# features.py
+import numpy as np
+
+KEYS = ["store_id","product_id"]
+
+
+def sort_series(df, keys=KEYS):
+    """Sort rows by series key then date, the layout every kernel below expects."""
+    return df.sort_values(keys + ["dt"], kind="stable")
+
+
+def group_offsets(df, keys=KEYS):
+    """
+    Boundaries of each run of equal keys in a frame sorted by `keys`:
+    series g occupies rows offsets[g]:offsets[g+1].
+    """
+    n = len(df)
+    if n == 0:
+        return np.zeros(1, dtype=np.int64)
+    key_values = df[keys].to_numpy()
+    change = (key_values[1:] != key_values[:-1]).any(axis=1)
+    return np.r_[0, np.flatnonzero(change) + 1, n].astype(np.int64)
+
+
+def _positions(offsets):
+    """Index of every row within its own series."""
+    n = offsets[-1]
+    starts = offsets[:-1]
+    return np.arange(n) - np.repeat(starts, np.diff(offsets))
+
+
+class _PrefixSums:
+    """
+    Prefix sums over NaN-zeroed values plus a prefix count of NaNs, built once
+    and shared by every window; a window containing a NaN comes out NaN,
+    like rolling().mean().
+    """
+
+    def __init__(self, values):
+        nan = np.isnan(values)
+        self.csum = np.zeros(len(values) + 1)
+        np.cumsum(np.where(nan, 0.0, values), out=self.csum[1:])
+        self.cnan = None
+        if nan.any():
+            self.cnan = np.zeros(len(values) + 1, dtype=np.int64)
+            np.cumsum(nan, out=self.cnan[1:])
+
+    def __call__(self, values, window):
+        sums = np.full(len(values), np.nan)
+        if len(values) >= window:
+            sums[window - 1:] = self.csum[window:] - self.csum[:-window]
+            if self.cnan is not None:
+                sums[window - 1:][(self.cnan[window:] - self.cnan[:-window]) > 0] = np.nan
+        return sums
+
+
+def _window_sums_direct(values, window):
+    # Each window summed from its own values in a fixed order, so a row's
+    # result depends only on its window (needed for byte-identical incremental runs).
+    sums = values.copy()
+    for k in range(1, window):
+        sums[k:] += values[:-k]
+    return sums
+
+
+def grouped_window_features(values, offsets, lags=(1,), windows=(7,), tail_only=False, method="cumsum"):
+    """
+    Lags and trailing window means of `values` within each series, in one pass
+    over arrays sorted by series and date.
+
+    Matches groupby(...).shift(k) and groupby(...).transform(lambda x: x.rolling(w).mean()):
+    NaN until a series has enough history, and NaN for any window containing a NaN.
+
+    With tail_only=True the features are evaluated only at each series' last row
+    and every returned array has one entry per series.
+
+    method="cumsum" gets every window from prefix sums in O(n) whatever the
+    window size; method="direct" sums each window's own values instead.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = {}
+
+    if tail_only:
+        starts, ends = offsets[:-1], offsets[1:]
+        for k in lags:
+            idx = ends - 1 - k
+            lag = np.full(len(ends), np.nan)
+            ok = idx >= starts
+            lag[ok] = values[idx[ok]]
+            out[f"lag_{k}"] = lag
+        for w in windows:
+            ma = np.full(len(ends), np.nan)
+            ok = ends - w >= starts
+            idx = ends[ok, None] - np.arange(w, 0, -1)
+            ma[ok] = values[idx].sum(axis=1) / w
+            out[f"ma_{w}"] = ma
+        return out
+
+    pos = _positions(offsets)
+    for k in lags:
+        lag = np.full(len(values), np.nan)
+        lag[k:] = values[:-k] if k else values
+        lag[pos < k] = np.nan
+        out[f"lag_{k}"] = lag
+    window_sums = _window_sums_direct if method == "direct" else _PrefixSums(values)
+    for w in windows:
+        ma = window_sums(values, w) / w
+        ma[pos < w - 1] = np.nan
+        out[f"ma_{w}"] = ma
+    return out
+
+
+def add_sales_features(df, lags=(1,), windows=(7,), tail_only=False, method="cumsum",
+                       value_col="sale_amount", keys=KEYS):
+    """
+    Add sales_lag_{k} and sales_ma_{w} columns to a frame sorted with sort_series().
+
+    With tail_only=True, return instead one row per series (keys plus the
+    feature columns) evaluated at that series' latest row.
+    """
+    offsets = group_offsets(df, keys)
+    feats = grouped_window_features(df[value_col].to_numpy(), offsets, lags, windows, tail_only, method)
+    named = {f"sales_{name}": arr for name, arr in feats.items()}
+
+    if tail_only:
+        last = df.iloc[offsets[1:] - 1][keys].reset_index(drop=True)
+        return last.assign(**named)
+    return df.assign(**named)
@@ -0,0 +1,168 @@
+# inference.py
+import os
+import sys
+import argparse
+import threading
+import numpy as np
+import joblib
+import xgboost as xgb
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+try:
+    import treelite
+    import tl2cgen
+except ImportError:     # the compiled backend is optional
+    treelite = tl2cgen = None
+
+MODEL_PATH = "model/xgb_stock_forecast_model.pkl"
+# The compiled backend is offered only where treelite/tl2cgen are installed
+BACKENDS = ["sklearn", "booster"] + (["compiled"] if tl2cgen is not None else [])
+DEFAULT_BACKEND = "booster"
+
+
+def booster_path(model_path=MODEL_PATH):
+    """model/x.pkl -> model/x.ubj, the native UBJSON copy of the booster"""
+    return os.path.splitext(model_path)[0] + ".ubj"
+
+
+def compiled_path(model_path=MODEL_PATH):
+    """model/x.pkl -> model/x.so, the predictor compiled from the booster"""
+    return os.path.splitext(model_path)[0] + ".so"
+
+
+def save_booster(booster, path):
+    """Write `booster` as UBJSON to a temp file and rename it into place."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(booster.save_raw("ubj"))
+    os.replace(tmp_path, path)
+
+
+def load_booster(model_path=MODEL_PATH):
+    """
+    The booster from its UBJSON copy, without unpickling the sklearn wrapper.
+    Falls back to the pickle when the copy is missing or older than it.
+    """
+    ubj = booster_path(model_path)
+    if os.path.exists(ubj) and not (os.path.exists(model_path)
+                                    and os.path.getmtime(model_path) > os.path.getmtime(ubj)):
+        booster = xgb.Booster()
+        booster.load_model(ubj)
+        return booster
+    return joblib.load(model_path).get_booster()
+
+
+class SklearnBackend:
+    """The pickled XGBRegressor and its predict(), as the scripts originally used it."""
+
+    name = "sklearn"
+
+    def __init__(self, model_path=MODEL_PATH, nthread=None):
+        self.model = joblib.load(model_path)
+        if nthread:
+            self.model.set_params(n_jobs=nthread)
+
+    def predict(self, X):
+        return self.model.predict(X)
+
+
+class BoosterBackend:
+    """
+    The native booster, predicting with inplace_predict on a contiguous
+    float32 matrix (the type XGBoost converts every input to), so no DMatrix
+    or sklearn wrapper is built per call.
+    """
+
+    name = "booster"
+
+    def __init__(self, model_path=MODEL_PATH, nthread=None):
+        self.booster = load_booster(model_path)
+        if nthread:
+            self.booster.set_param({"nthread": nthread})
+
+    def predict(self, X):
+        return self.booster.inplace_predict(np.ascontiguousarray(X, dtype=np.float32))
+
+
+def compile_model(model_path=MODEL_PATH, nthread=0):
+    """Compile the booster into a shared library with treelite/tl2cgen (needs gcc)."""
+    if tl2cgen is None:
+        raise RuntimeError("The compiled backend needs the treelite and tl2cgen packages.")
+    tl_model = treelite.frontend.from_xgboost(load_booster(model_path))
+    lib_path = compiled_path(model_path)
+    tmp_path = lib_path + ".tmp.so"
+    tl2cgen.export_lib(tl_model, toolchain="gcc", libpath=tmp_path,
+                       params={"parallel_comp": max(nthread, os.cpu_count() or 1)})
+    os.replace(tmp_path, lib_path)
+    return lib_path
+
+
+class CompiledBackend:
+    """
+    The booster's trees compiled to C, loaded as a tl2cgen predictor; built on
+    first use. Sums the trees in a different float32 order than XGBoost, so
+    predictions agree to about 1e-6 relative and a rounded forecast can
+    differ by 0.01 (benchmarks/bench_inference.py checks both).
+    """
+
+    name = "compiled"
+
+    def __init__(self, model_path=MODEL_PATH, nthread=None):
+        if tl2cgen is None:
+            raise RuntimeError("The compiled backend needs the treelite and tl2cgen packages.")
+        lib_path = compiled_path(model_path)
+        sources = [p for p in (model_path, booster_path(model_path)) if os.path.exists(p)]
+        if not os.path.exists(lib_path) or any(os.path.getmtime(p) > os.path.getmtime(lib_path) for p in sources):
+            print(f"Compiling {model_path} to {lib_path}...")
+            compile_model(model_path)
+        self.predictor = tl2cgen.Predictor(lib_path, nthread=nthread or None)
+
+    def predict(self, X):
+        dmat = tl2cgen.DMatrix(np.ascontiguousarray(X, dtype=np.float32))
+        return self.predictor.predict(dmat).reshape(-1)
+
+
+BACKEND_CLASSES = {cls.name: cls for cls in (SklearnBackend, BoosterBackend, CompiledBackend)}
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def model_signature(model_path=MODEL_PATH):
+    """(mtime_ns, size) of the pickle and its UBJSON copy; changes whenever either is rewritten."""
+    paths = [model_path, booster_path(model_path)]
+    return tuple((os.stat(p).st_mtime_ns, os.stat(p).st_size) if os.path.exists(p) else None for p in paths)
+
+
+def load_backend(name=DEFAULT_BACKEND, model_path=MODEL_PATH, nthread=None):
+    """
+    A loaded model kept warm for the life of the process: repeat calls return
+    the same backend until the model files change on disk.
+    """
+    key = (name, os.path.abspath(model_path), nthread)
+    signature = model_signature(model_path)
+    with _loaded_lock:
+        cached = _loaded.get(key)
+        if cached is None or cached[0] != signature:
+            cached = (signature, BACKEND_CLASSES[name](model_path, nthread))
+            _loaded[key] = cached
+        return cached[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the forecast model for the fast inference backends.")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--compile", action="store_true", help="also build the treelite-compiled predictor")
+    args = parser.parse_args()
+
+    save_booster(joblib.load(args.model).get_booster(), booster_path(args.model))
+    print(f"✅ Booster saved to {booster_path(args.model)}")
+    if args.compile:
+        print(f"✅ Compiled predictor saved to {compile_model(args.model)}")
+
+
+if __name__ == "__main__":
+    main()
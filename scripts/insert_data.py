@@ -1,66 +1,64 @@
+import os
+import sys
+import argparse
 from datasets import load_dataset
-import mysql.connector
 import pandas as pd
-import numpy as np
 
-print("Loading FreshRetailNet-50K dataset...")
-
-# Load dataset
-dataset = load_dataset("Dingdong-Inc/FreshRetailNet-50K")
-df = dataset["train"].to_pandas()
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
 
-# 🟢 Stratified sampling to include multiple cities
-# Take up to 5000 rows per city (adjust if needed)
-df_sampled = df.groupby("city_id", group_keys=False).apply(
-    lambda x: x.sample(n=min(len(x), 5000), random_state=42)
-)
+from scripts.bulk_loader import COLUMNS, BulkLoader, iter_chunks, mysql_connect, sqlite_connect
 
-# If total rows >50,000, randomly sample 50k
-if len(df_sampled) > 50000:
-    df_sampled = df_sampled.sample(50000, random_state=42)
+parser = argparse.ArgumentParser(description="Load FreshRetailNet-50K into the retail_data table.")
+parser.add_argument("--full", action="store_true",
+                    help="stream the whole dataset instead of the stratified 50K sample")
+parser.add_argument("--method", choices=["insert", "load_data"], default="insert",
+                    help="multi-row INSERT upserts, or LOAD DATA LOCAL INFILE ... REPLACE (MySQL only)")
+parser.add_argument("--workers", type=int, default=4, help="parallel database connections")
+parser.add_argument("--chunk-rows", type=int, default=50000, help="rows per streamed chunk")
+parser.add_argument("--sqlite", metavar="PATH",
+                    help="load into a SQLite file instead of MySQL (local testing)")
+args = parser.parse_args()
 
-print(f"Sampled {len(df_sampled)} rows across multiple cities.")
-
-# Keep only columns that exist in your MySQL table
-cols = [
-    "city_id", "store_id", "product_id", "dt", "sale_amount",
-    "stock_hour6_22_cnt", "discount", "holiday_flag", "activity_flag"
-]
+print("Loading FreshRetailNet-50K dataset...")
 
-df_sampled = df_sampled[cols].replace({np.nan: None})
-df_sampled["dt"] = df_sampled["dt"].astype(str)
+# Load dataset
+dataset = load_dataset("Dingdong-Inc/FreshRetailNet-50K")
 
-# Convert numpy types to native Python
-def convert_value(x):
-    if isinstance(x, (np.integer, np.floating)):
-        return x.item()
-    return x
+if args.full:
+    # Stream Arrow record batches straight from the dataset
+    source = dataset["train"].data.table
+    print(f"Streaming all {source.num_rows} rows.")
+else:
+    df = dataset["train"].to_pandas()
 
-data = []
-for row in df_sampled.itertuples(index=False, name=None):
-    data.append(tuple(convert_value(v) for v in row))
+    # 🟢 Stratified sampling to include multiple cities
+    # Take up to 5000 rows per city (adjust if needed)
+    df_sampled = df.groupby("city_id", group_keys=False).apply(
+        lambda x: x.sample(n=min(len(x), 5000), random_state=42)
+    )
 
-# Connect to MySQL
-conn = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="Bhakthi@13",
-    database="smartstock"
-)
-cursor = conn.cursor()
+    # If total rows >50,000, randomly sample 50k
+    if len(df_sampled) > 50000:
+        df_sampled = df_sampled.sample(50000, random_state=42)
 
-column_names = ", ".join(cols)
-placeholders = ", ".join(["%s"] * len(cols))
-query = f"INSERT INTO retail_data ({column_names}) VALUES ({placeholders})"
+    print(f"Sampled {len(df_sampled)} rows across multiple cities.")
+    # Keep only columns that exist in your MySQL table
+    source = df_sampled[COLUMNS]
 
-print("Inserting into MySQL...")
-batch_size = 5000
-for i in range(0, len(data), batch_size):
-    batch = data[i:i+batch_size]
-    cursor.executemany(query, batch)
-    conn.commit()
-    print(f"Inserted rows {i+1} to {i+len(batch)}")
+# Connect to MySQL (or a local SQLite stand-in)
+if args.sqlite:
+    loader = BulkLoader(lambda: sqlite_connect(args.sqlite), dialect="sqlite",
+                        method=args.method, workers=args.workers)
+else:
+    loader = BulkLoader(lambda: mysql_connect(
+                            host=os.environ.get("MYSQL_HOST", "localhost"),
+                            user=os.environ.get("MYSQL_USER", "root"),
+                            password=os.environ.get("MYSQL_PASSWORD", "Bhakthi@13"),
+                            database=os.environ.get("MYSQL_DATABASE", "smartstock")),
+                        method=args.method, workers=args.workers)
 
-cursor.close()
-conn.close()
-print("Done inserting sampled data.")
+print(f"Upserting into retail_data ({args.method}, {args.workers} connections)...")
+rows, seconds, rate = loader.load(iter_chunks(source, args.chunk_rows))
+print(f"Done: {rows} rows in {seconds:.1f}s ({rate:,.0f} rows/sec).")
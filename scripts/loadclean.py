@@ -1,64 +1,25 @@
+import os
+import sys
+import argparse
 import pandas as pd
 import numpy as np
+import joblib
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.features import KEYS, group_offsets, grouped_window_features
+from scripts.metrics import span
+from scripts.repository import ForecastRepository, make_engine
+from scripts.storage import read_frame, write_frame
+
+RAW_PATH = "data/cleaned_retail_data.csv"
+OUTPUT_PATH = "data/cleaned_retail_data_with_names.parquet"
+CHECKPOINT_PATH = "data/loadclean_checkpoint.pkl"
+
+MA_WINDOW = 7
 
-print("Loading cleaned retail data...")
-
-# Load main cleaned data
-df = pd.read_csv("data/cleaned_retail_data.csv")
-
-# Load mapping CSVs
-cities = pd.read_csv("data/cities.csv")       # city_id, city_name
-stores = pd.read_csv("data/stores.csv")       # store_id, company_name, branch_name
-products = pd.read_csv("data/products.csv")   # product_id, product_name
-
-# Ensure IDs are integers
-df["city_id"] = df["city_id"].astype(int)
-df["store_id"] = df["store_id"].astype(int)
-df["product_id"] = df["product_id"].astype(int)
-cities["city_id"] = cities["city_id"].astype(int)
-stores["store_id"] = stores["store_id"].astype(int)
-products["product_id"] = products["product_id"].astype(int)
-
-# Merge city names
-df = df.merge(cities, on="city_id", how="left")
-
-# Merge store names, fill missing automatically
-df = df.merge(stores, on="store_id", how="left")
-df['company_name'] = df['company_name'].fillna('Company_' + df['store_id'].astype(str))
-df['branch_name'] = df['branch_name'].fillna('Branch_' + df['store_id'].astype(str))
-
-# Merge product names, fill missing automatically
-df = df.merge(products, on="product_id", how="left")
-df['product_name'] = df['product_name'].fillna('Product_' + df['product_id'].astype(str))
-
-# Check for missing names
-missing_city = df["city_name"].isna().sum()
-missing_store = df["company_name"].isna().sum()
-missing_product = df["product_name"].isna().sum()
-print(f"Missing city names: {missing_city}")
-print(f"Missing store names: {missing_store}")
-print(f"Missing product names: {missing_product}")
-
-# Convert date column
-df["dt"] = pd.to_datetime(df["dt"], errors="coerce")
-df = df.dropna(subset=["dt"])
-
-# Extract date features
-df["year"] = df["dt"].dt.year
-df["month"] = df["dt"].dt.month
-df["day"] = df["dt"].dt.day
-df["day_of_week"] = df["dt"].dt.dayofweek
-df["is_weekend"] = df["day_of_week"].isin([5,6]).astype(int)
-
-# Sort and compute lag and 7-day moving average
-df = df.sort_values(["store_id", "product_id", "dt"])
-df["sales_lag_1"] = df.groupby(["store_id","product_id"])["sale_amount"].shift(1)
-df["sales_ma_7"] = df.groupby(["store_id","product_id"])["sale_amount"].transform(lambda x: x.rolling(7).mean())
-
-# Drop rows where new features are NaN
-df = df.dropna(subset=["sales_lag_1","sales_ma_7"])
-
-# Reorder columns
 cols_order = [
     "city_id","city_name",
     "store_id","company_name","branch_name",
@@ -68,11 +29,195 @@ cols_order = [
     "year","month","day","day_of_week","is_weekend",
     "sales_lag_1","sales_ma_7"
 ]
-cols_order = [c for c in cols_order if c in df.columns]
-df = df[cols_order]
 
-# Save final CSV
-df.to_csv("data/cleaned_retail_data_with_names.csv", index=False)
 
-print("Preprocessing complete!")
-print("Saved: cleaned_retail_data_with_names.csv")
+def load_mappings():
+    cities = pd.read_csv("data/cities.csv")       # city_id, city_name
+    stores = pd.read_csv("data/stores.csv")       # store_id, company_name, branch_name
+    products = pd.read_csv("data/products.csv")   # product_id, product_name
+    cities["city_id"] = cities["city_id"].astype(int)
+    stores["store_id"] = stores["store_id"].astype(int)
+    products["product_id"] = products["product_id"].astype(int)
+    return cities, stores, products
+
+
+def enrich(df, cities, stores, products):
+    """Merge names onto raw rows, parse dates and add calendar features."""
+    # Ensure IDs are integers
+    df["city_id"] = df["city_id"].astype(int)
+    df["store_id"] = df["store_id"].astype(int)
+    df["product_id"] = df["product_id"].astype(int)
+
+    # Merge city names
+    df = df.merge(cities, on="city_id", how="left")
+
+    # Merge store names, fill missing automatically
+    df = df.merge(stores, on="store_id", how="left")
+    df['company_name'] = df['company_name'].fillna('Company_' + df['store_id'].astype(str))
+    df['branch_name'] = df['branch_name'].fillna('Branch_' + df['store_id'].astype(str))
+
+    # Merge product names, fill missing automatically
+    df = df.merge(products, on="product_id", how="left")
+    df['product_name'] = df['product_name'].fillna('Product_' + df['product_id'].astype(str))
+
+    # Check for missing names
+    missing_city = df["city_name"].isna().sum()
+    missing_store = df["company_name"].isna().sum()
+    missing_product = df["product_name"].isna().sum()
+    print(f"Missing city names: {missing_city}")
+    print(f"Missing store names: {missing_store}")
+    print(f"Missing product names: {missing_product}")
+
+    # Convert date column
+    df["dt"] = pd.to_datetime(df["dt"], errors="coerce")
+    df = df.dropna(subset=["dt"])
+
+    # Extract date features
+    df["year"] = df["dt"].dt.year
+    df["month"] = df["dt"].dt.month
+    df["day"] = df["dt"].dt.day
+    df["day_of_week"] = df["dt"].dt.dayofweek
+    df["is_weekend"] = df["day_of_week"].isin([5,6]).astype(int)
+    return df
+
+
+def lag_ma_features(df):
+    """
+    sales_lag_1 and sales_ma_7 for a frame sorted by store_id, product_id, dt.
+
+    Uses the direct window kernel, so a row's features depend only on its own
+    window and an incremental run from a checkpointed tail is byte-identical
+    to a full rebuild.
+    """
+    feats = grouped_window_features(df["sale_amount"].to_numpy(), group_offsets(df, KEYS),
+                                    lags=(1,), windows=(MA_WINDOW,), method="direct")
+    return feats["lag_1"], feats[f"ma_{MA_WINDOW}"]
+
+
+def finalize(df):
+    # Drop rows where new features are NaN
+    df = df.dropna(subset=["sales_lag_1","sales_ma_7"])
+
+    # Reorder columns
+    return df[[c for c in cols_order if c in df.columns]]
+
+
+def make_checkpoint(df):
+    """Watermark plus the trailing window of raw sales for every series."""
+    tails = df.groupby(KEYS, sort=False).tail(MA_WINDOW - 1)[KEYS + ["dt","sale_amount"]]
+    return {"watermark": df["dt"].max(), "tails": tails.reset_index(drop=True)}
+
+
+def save_checkpoint(checkpoint, path=CHECKPOINT_PATH):
+    tmp_path = path + ".tmp"
+    joblib.dump(checkpoint, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def full_rebuild():
+    print("Loading cleaned retail data...")
+    with span("loadclean.read") as s:
+        df = pd.read_csv(RAW_PATH)
+        s.rows = len(df)
+    with span("loadclean.enrich", rows=len(df)):
+        df = enrich(df, *load_mappings())
+
+    # Sort and compute lag and 7-day moving average
+    with span("loadclean.features", rows=len(df)):
+        df = df.sort_values(["store_id", "product_id", "dt"])
+        df["sales_lag_1"], df["sales_ma_7"] = lag_ma_features(df)
+
+    return finalize(df), make_checkpoint(df)
+
+
+def incremental_update(checkpoint):
+    """
+    Process only raw rows newer than the checkpoint watermark and append them.
+    Returns the new history and checkpoint (None when nothing was new).
+    """
+    watermark = checkpoint["watermark"]
+    print(f"Loading cleaned retail data newer than {watermark.date()}...")
+
+    with span("loadclean.read") as s:
+        chunks = []
+        for chunk in pd.read_csv(RAW_PATH, chunksize=500_000):
+            dt = pd.to_datetime(chunk["dt"], errors="coerce")
+            chunks.append(chunk[dt > watermark])
+        new = pd.concat(chunks, ignore_index=True)
+        existing = read_frame(OUTPUT_PATH)
+        # Days saved by a run that died before its checkpoint was written are redone
+        existing = existing[pd.to_datetime(existing["dt"]) <= watermark]
+        s.rows = len(new)
+    if new.empty:
+        print("No new rows since last run.")
+        return existing, None
+
+    with span("loadclean.enrich", rows=len(new)):
+        new = enrich(new, *load_mappings())
+
+    # Features for new rows come from each series' stored tail plus the new values
+    with span("loadclean.features", rows=len(new)):
+        new = new.sort_values(["store_id", "product_id", "dt"]).reset_index(drop=True)
+        series = pd.concat([checkpoint["tails"].assign(_row=-1),
+                            new[KEYS + ["dt","sale_amount"]].assign(_row=np.arange(len(new)))],
+                           ignore_index=True)
+        series = series.sort_values(["store_id", "product_id", "dt"])
+        lag, ma = lag_ma_features(series)
+        rows = series["_row"].to_numpy()
+        new.loc[rows[rows >= 0], "sales_lag_1"] = lag[rows >= 0]
+        new.loc[rows[rows >= 0], "sales_ma_7"] = ma[rows >= 0]
+
+    checkpoint = make_checkpoint(series.drop(columns="_row"))
+    print(f"Appending {len(new)} new rows to {len(existing)} existing rows")
+    df = pd.concat([existing, finalize(new)], ignore_index=True)
+    df = df.sort_values(["store_id", "product_id", "dt"], kind="stable")
+    return df[cols_order].reset_index(drop=True), checkpoint
+
+
+def build(incremental=False):
+    """
+    (df, incremental, checkpoint): the cleaned history with names and
+    features, whether it was built incrementally (only when a checkpoint and a
+    previous output exist), and the checkpoint to pass to save(). Nothing is
+    written here.
+    """
+    incremental = incremental and os.path.exists(CHECKPOINT_PATH) and os.path.exists(OUTPUT_PATH)
+    if incremental:
+        df, checkpoint = incremental_update(joblib.load(CHECKPOINT_PATH))
+        return df, True, checkpoint
+    df, checkpoint = full_rebuild()
+    return df, False, checkpoint
+
+
+def save(df, incremental=False, checkpoint=None):
+    # Save as Parquet with explicit dtypes; later stages and the web app read it
+    # instead of re-parsing CSV
+    with span("loadclean.save", rows=len(df)):
+        write_frame(df, OUTPUT_PATH)
+    # Only once the rows are on disk may the watermark move past them
+    if checkpoint is not None:
+        save_checkpoint(checkpoint)
+
+    print("Preprocessing complete!")
+    print("Saved: cleaned_retail_data_with_names.parquet")
+
+    # Mirror into the app database when configured; incremental runs append only new days
+    if os.environ.get("DATABASE_URL"):
+        repo = ForecastRepository(make_engine())
+        repo.create_schema()
+        n = repo.publish_history(df, replace=not incremental)
+        print(f"Published {n} history rows to database")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build cleaned retail data with names and sales features.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only process rows newer than the last checkpoint (falls back to a full rebuild)")
+    args = parser.parse_args()
+
+    df, incremental, checkpoint = build(args.incremental)
+    save(df, incremental, checkpoint)
+
+
+if __name__ == "__main__":
+    main()
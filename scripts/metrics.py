@@ -0,0 +1,272 @@
+# metrics.py
+import os
+import sys
+import time
+import atexit
+import fnmatch
+import itertools
+import resource
+import threading
+from bisect import bisect_left
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+# Seconds; the upper buckets are for batch stages
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rss_mb():
+    """Current resident set size, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_labels(self.label_names, key)} {value:g}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self, key, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total:g}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Metrics of this process in the Prometheus text format. Collectors are
+    callables returning extra lines, for values read at scrape time (e.g. the
+    DataCache counters).
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._register(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help, labels, buckets)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        PEAK_RSS.set(peak_rss_mb() * 1024 * 1024)
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+PEAK_RSS = REGISTRY.gauge("process_peak_rss_bytes", "Peak resident set size of this process.")
+STAGE_SECONDS = REGISTRY.histogram("batch_stage_seconds", "Wall time of batch stages.", ["stage"])
+STAGE_ROWS = REGISTRY.counter("batch_stage_rows_total", "Rows processed by batch stages.", ["stage"])
+
+
+# ---------------- Sampling profiler ----------------
+def profile_enabled(name):
+    """True if `name` matches a pattern in $PROFILE (comma-separated, fnmatch-style)."""
+    patterns = [p for p in os.environ.get("PROFILE", "").split(",") if p]
+    return any(fnmatch.fnmatchcase(name, p) for p in patterns)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a
+    background thread and tallies them as folded stacks ("root;...;leaf N"),
+    the input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = _Tally()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+_profile_seq = itertools.count(1)
+
+
+def profile_path(name):
+    profile_dir = os.environ.get("PROFILE_DIR", os.path.join("data", "profiles"))
+    safe = "".join(c if c.isalnum() or c in "._-" else "_" for c in name)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(profile_dir, f"{safe}-{stamp}-{os.getpid()}-{next(_profile_seq)}.folded")
+
+
+# ---------------- Batch spans ----------------
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.seconds = None
+
+
+@contextmanager
+def span(name, rows=None):
+    """
+    Time a batch stage: prints wall time, rows (set `.rows` inside the block),
+    RSS at the start and its growth during the block, and the process-wide
+    peak RSS so far; records them as metrics, and profiles the block when its
+    name matches $PROFILE.
+    """
+    s = Span(name)
+    s.rows = rows
+    start_rss = rss_mb()
+    profiler = SamplingProfiler().start() if profile_enabled(name) else None
+    start = time.perf_counter()
+    try:
+        yield s
+    finally:
+        s.seconds = time.perf_counter() - start
+        if profiler is not None:
+            profiler.stop()
+            path = profile_path(name)
+            profiler.write(path)
+            print(f"  profile of {name} written to {path}")
+        STAGE_SECONDS.observe(s.seconds, stage=name)
+        if s.rows is not None:
+            STAGE_ROWS.inc(s.rows, stage=name)
+        rows = f", {s.rows} rows" if s.rows is not None else ""
+        end_rss = rss_mb()
+        rss = f", RSS {start_rss:.0f} MB at start ({end_rss - start_rss:+.0f} MB)" if end_rss is not None else ""
+        print(f"  {name}: {s.seconds:.1f}s{rows}{rss}, process peak RSS {peak_rss_mb():.0f} MB")
+
+
+def write_textfile(path):
+    """The registry in a .prom file, for node_exporter's textfile collector."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp_path, path)
+
+
+# Batch scripts are not scraped; with $METRICS_TEXTFILE_DIR set each script
+# leaves <script>.prom there when it exits
+if os.environ.get("METRICS_TEXTFILE_DIR"):
+    _script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+    atexit.register(write_textfile, os.path.join(os.environ["METRICS_TEXTFILE_DIR"], f"{_script}.prom"))
@@ -0,0 +1,149 @@
+# pipeline.py
+import os
+import json
+import time
+import hashlib
+from datetime import datetime
+
+from scripts.metrics import span
+
+PIPELINE_STATE_PATH = "data/pipeline_state.json"
+
+
+def file_digest(path, known):
+    """
+    Content hash of a file. `known` maps paths to [size, mtime_ns, digest] and
+    is reused while a file's size and mtime are unchanged, so an untouched
+    multi-GB input is not read again on every run.
+    """
+    st = os.stat(path)
+    signature = [st.st_size, st.st_mtime_ns]
+    entry = known.get(path)
+    if entry and entry[:2] == signature:
+        return entry[2]
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    known[path] = signature + [h.hexdigest()]
+    return h.hexdigest()
+
+
+class Stage:
+    """
+    One step of a Pipeline.
+
+    run(ctx) does the work and returns the value later stages get from
+    ctx.get(name); load(ctx) rebuilds that value from the stage's output
+    files when it was skipped. A stage is skipped when the hash of its code,
+    input files, params and upstream outputs matches the last successful run
+    and its output files are unchanged.
+    """
+
+    def __init__(self, name, run, load=None, deps=(), inputs=(), outputs=(), code=(), params=None):
+        self.name = name
+        self.run = run
+        self.load = load
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = list(code)
+        self.params = params or {}
+
+
+class Pipeline:
+    """
+    Runs stages in order in one process, passing values in memory. State
+    (per-stage input hashes, output digests and timings) is kept in a JSON
+    file so the next run can skip whatever did not change.
+    """
+
+    def __init__(self, stages, state_path=PIPELINE_STATE_PATH):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        self.values = {}
+        self.state = self._read_state()
+
+    def _read_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"stages": {}, "digests": {}}
+
+    def _write_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def _digests(self, paths):
+        known = self.state["digests"]
+        return {p: file_digest(p, known) if os.path.exists(p) else None for p in paths}
+
+    def key(self, stage):
+        """Hash of everything the stage's result depends on."""
+        upstream = {dep: self._digests(self.stages[dep].outputs) for dep in stage.deps}
+        payload = {
+            "code": self._digests(stage.code),
+            "inputs": self._digests(stage.inputs),
+            "params": stage.params,
+            "upstream": upstream,
+        }
+        return hashlib.blake2b(json.dumps(payload, sort_keys=True, default=str).encode(),
+                               digest_size=16).hexdigest()
+
+    def is_current(self, stage, key):
+        last = self.state["stages"].get(stage.name)
+        if last is None or last.get("key") != key:
+            return False
+        outputs = self._digests(stage.outputs)
+        return None not in outputs.values() and outputs == last.get("outputs")
+
+    def get(self, name):
+        """A stage's value: from this run if it ran, else loaded from its output files."""
+        if name not in self.values:
+            stage = self.stages[name]
+            if stage.load is None:
+                raise RuntimeError(f"Stage {name!r} did not run and has no stored result to load.")
+            self.values[name] = stage.load(self)
+        return self.values[name]
+
+    def run(self, selected=None, force=()):
+        """
+        Run the `selected` stages (all by default) in order, rerunning those
+        in `force` even when current. Returns [(stage, status, seconds)].
+        """
+        report = []
+        for name, stage in self.stages.items():
+            if selected is not None and name not in selected:
+                report.append((name, "not selected", 0.0))
+                continue
+            start = time.perf_counter()
+            key = self.key(stage)
+            if name not in force and self.is_current(stage, key):
+                report.append((name, "cached", time.perf_counter() - start))
+                print(f"[{name}] inputs unchanged, reusing cached outputs")
+                continue
+
+            print(f"[{name}] running...")
+            with span(f"pipeline.{name}"):
+                self.values[name] = stage.run(self)
+            seconds = time.perf_counter() - start
+            self.state["stages"][name] = {
+                "key": key,
+                "outputs": self._digests(stage.outputs),
+                "seconds": round(seconds, 2),
+                "at": datetime.now().isoformat(timespec="seconds"),
+            }
+            # Saved after every stage, so a failure later keeps the work done so far
+            self._write_state()
+            report.append((name, "ran", seconds))
+        return report
+
+
+def print_report(report):
+    print(f"{'stage':<12}{'status':<14}{'seconds':>8}")
+    for name, status, seconds in report:
+        print(f"{name:<12}{status:<14}{seconds:8.2f}")
+    print(f"{'total':<26}{sum(r[2] for r in report):8.2f}")
@@ -0,0 +1,272 @@
+# repository.py
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import (
+    Boolean, Column, Date, Float, Index, Integer, MetaData, String, Table,
+    create_engine, event, func, select,
+)
+
+from scripts.alerts_summary import REORDER_COLS, prepare_alerts
+
+ALERT_VALUES = ("UNDERSTOCK", "OVERSTOCK", "OK")
+FORECAST_DAYS = 7
+MAX_PAGE_SIZE = 500
+INSERT_CHUNK_ROWS = 50000
+
+metadata = MetaData()
+
+# Cleaned history with names, as written by loadclean.py
+history = Table(
+    "retail_history", metadata,
+    Column("city_id", Integer),
+    Column("city_name", String(64)),
+    Column("store_id", Integer, nullable=False),
+    Column("company_name", String(64)),
+    Column("branch_name", String(64)),
+    Column("product_id", Integer, nullable=False),
+    Column("product_name", String(128)),
+    Column("dt", Date, nullable=False),
+    Column("sale_amount", Float),
+    Column("stock_hour6_22_cnt", Integer),
+    Column("discount", Float),
+    Column("holiday_flag", Integer),
+    Column("activity_flag", Integer),
+    Column("year", Integer),
+    Column("month", Integer),
+    Column("day", Integer),
+    Column("day_of_week", Integer),
+    Column("is_weekend", Integer),
+    Column("sales_lag_1", Float),
+    Column("sales_ma_7", Float),
+    Index("uq_history_store_product_dt", "store_id", "product_id", "dt", unique=True),
+    # Covers the city/branch lookups, so they never touch the table rows
+    Index("ix_history_city_branch", "city_name", "branch_name", "store_id", "company_name", "city_id"),
+)
+
+# Forecast with alerts, as written by xgb_forecast.py. row_id keeps the file's
+# row order; the any_* flags and reorder_qty are derived at publish time so the
+# dashboard aggregates are plain indexed predicates.
+forecast = Table(
+    "stock_forecast", metadata,
+    Column("row_id", Integer, primary_key=True, autoincrement=False),
+    Column("store_id", Integer, nullable=False),
+    Column("product_id", Integer, nullable=False),
+    Column("city_name", String(64)),
+    Column("company_name", String(64)),
+    Column("branch_name", String(64)),
+    Column("product_name", String(128)),
+    Column("stock_hour6_22_cnt", Integer),
+    *[c for i in range(1, FORECAST_DAYS + 1)
+      for c in (Column(f"day_{i}_forecast", Float), Column(f"day_{i}_alert", String(16)))],
+    Column("any_understock", Boolean, nullable=False),
+    Column("any_overstock", Boolean, nullable=False),
+    Column("any_ok", Boolean, nullable=False),
+    Column("reorder_qty", Float, nullable=False),
+    Index("ix_forecast_city_branch", "city_name", "branch_name"),
+    Index("uq_forecast_store_product", "store_id", "product_id", unique=True),
+    Index("ix_forecast_understock", "any_understock", "city_name", "branch_name"),
+    Index("ix_forecast_overstock", "any_overstock", "city_name", "branch_name"),
+    Index("ix_forecast_reorder", "reorder_qty"),
+)
+
+FORECAST_COLUMNS = ["store_id","product_id","city_name","company_name","branch_name","product_name",
+                    "stock_hour6_22_cnt"] + [c for i in range(1, FORECAST_DAYS + 1)
+                                             for c in (f"day_{i}_forecast", f"day_{i}_alert")]
+ALERT_FLAGS = {"UNDERSTOCK": "any_understock", "OVERSTOCK": "any_overstock", "OK": "any_ok"}
+
+
+def make_engine(url=None, pool_size=None, max_overflow=None):
+    """
+    Pooled engine for `url` (default $DATABASE_URL). MySQL connections are
+    pinged on checkout and recycled hourly so idle ones dropped by the server
+    are never handed out; SQLite files run in WAL mode so reads proceed while
+    a publish is writing.
+    """
+    url = url or os.environ["DATABASE_URL"]
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 60})
+
+        @event.listens_for(engine, "connect")
+        def _wal(dbapi_conn, _):
+            dbapi_conn.execute("PRAGMA journal_mode=WAL")
+        return engine
+    return create_engine(
+        url,
+        pool_size=pool_size or int(os.environ.get("DB_POOL_SIZE", 5)),
+        max_overflow=max_overflow or int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        pool_pre_ping=True,
+        pool_recycle=3600,
+    )
+
+
+def _records(df):
+    """Row dicts with NaN as None and dates as datetime.date."""
+    df = df.copy()
+    if "dt" in df.columns:
+        df["dt"] = pd.to_datetime(df["dt"]).dt.date
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def _insert_chunks(conn, table, df):
+    for i in range(0, len(df), INSERT_CHUNK_ROWS):
+        conn.execute(table.insert(), _records(df.iloc[i:i + INSERT_CHUNK_ROWS]))
+
+
+class ForecastRepository:
+    """
+    Read and publish path for the forecast and history tables. Filters, counts
+    and top-N aggregates run in the database against the indexes above, so a
+    request reads only the rows it returns.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def create_schema(self):
+        metadata.create_all(self.engine)
+
+    # ---------------- Publish ----------------
+    def publish_forecast(self, forecast_df):
+        """Replace the forecast table in one transaction; readers see old or new rows."""
+        understock, overstock, reorder = prepare_alerts(forecast_df)
+        alerts = forecast_df[[c for c in forecast_df.columns if c.endswith("_alert")]].to_numpy()
+        df = forecast_df[FORECAST_COLUMNS].assign(
+            row_id=np.arange(len(forecast_df)),
+            any_understock=understock,
+            any_overstock=overstock,
+            any_ok=(alerts == "OK").any(axis=1),
+            reorder_qty=reorder,
+        )
+        with self.engine.begin() as conn:
+            conn.execute(forecast.delete())
+            _insert_chunks(conn, forecast, df)
+
+    def publish_history(self, history_df, replace=True):
+        """Replace the history table, or append only rows newer than the latest it holds."""
+        columns = [c.name for c in history.columns]
+        with self.engine.begin() as conn:
+            if replace:
+                conn.execute(history.delete())
+            else:
+                watermark = conn.execute(select(func.max(history.c.dt))).scalar_one()
+                if watermark is not None:
+                    history_df = history_df[pd.to_datetime(history_df["dt"]) > pd.Timestamp(watermark)]
+            _insert_chunks(conn, history, history_df[columns])
+        return len(history_df)
+
+    # ---------------- Branch lookups ----------------
+    def cities(self):
+        q = (select(history.c.city_id, history.c.city_name).distinct()
+             .order_by(history.c.city_name, history.c.city_id))
+        with self.engine.connect() as conn:
+            return [dict(r._mapping) for r in conn.execute(q)]
+
+    def stores(self):
+        cols = [history.c.city_id, history.c.city_name, history.c.store_id,
+                history.c.company_name, history.c.branch_name]
+        q = select(*cols).distinct().order_by(history.c.city_name, history.c.branch_name, history.c.store_id)
+        with self.engine.connect() as conn:
+            return [dict(r._mapping) for r in conn.execute(q)]
+
+    def branches_for_city(self, city):
+        q = (select(history.c.branch_name, history.c.store_id, history.c.company_name).distinct()
+             .where(history.c.city_name == city)
+             .order_by(history.c.branch_name, history.c.store_id))
+        with self.engine.connect() as conn:
+            return [dict(r._mapping) for r in conn.execute(q)]
+
+    # ---------------- Forecast reads ----------------
+    @staticmethod
+    def _scope(city=None, branch=None):
+        where = []
+        if city:
+            where.append(forecast.c.city_name == city)
+        if branch:
+            where.append(forecast.c.branch_name == branch)
+        return where
+
+    def count(self, city=None, branch=None):
+        q = select(func.count()).select_from(forecast).where(*self._scope(city, branch))
+        with self.engine.connect() as conn:
+            return conn.execute(q).scalar_one()
+
+    def preview(self, city=None, branch=None, limit=50):
+        """First `limit` forecast rows in scope, in file order, as a DataFrame."""
+        q = (select(*[forecast.c[c] for c in FORECAST_COLUMNS])
+             .where(*self._scope(city, branch)).order_by(forecast.c.row_id).limit(limit))
+        with self.engine.connect() as conn:
+            return pd.DataFrame(conn.execute(q).fetchall(), columns=FORECAST_COLUMNS)
+
+    def parse_sort(self, sort):
+        """'city_name,-day_1_forecast' -> ORDER BY clauses, with file order breaking ties."""
+        clauses = []
+        for part in (sort or "").split(","):
+            part = part.strip()
+            if not part:
+                continue
+            col = part.lstrip("-")
+            if col not in FORECAST_COLUMNS:
+                raise ValueError(f"unknown sort column: {col}")
+            clauses.append(forecast.c[col].desc() if part.startswith("-") else forecast.c[col].asc())
+        return clauses + [forecast.c.row_id]
+
+    def page(self, page=1, page_size=50, city=None, branch=None, alert=None, sort=None):
+        """Same payload as ForecastQuery.page, with filtering, sorting and LIMIT in SQL."""
+        if alert and alert not in ALERT_VALUES:
+            raise ValueError(f"unknown alert: {alert}")
+        order = self.parse_sort(sort)
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        page = max(1, int(page))
+
+        where = self._scope(city, branch)
+        if alert:
+            where.append(forecast.c[ALERT_FLAGS[alert]].is_(True))
+        rows_q = (select(*[forecast.c[c] for c in FORECAST_COLUMNS]).where(*where)
+                  .order_by(*order).limit(page_size).offset((page - 1) * page_size))
+        count_q = select(func.count()).select_from(forecast).where(*where)
+        with self.engine.connect() as conn:
+            total = conn.execute(count_q).scalar_one()
+            rows = [list(r) for r in conn.execute(rows_q)]
+        return {
+            "total": int(total),
+            "page": page,
+            "page_size": page_size,
+            "pages": int(-(-total // page_size)),
+            "columns": FORECAST_COLUMNS,
+            "rows": rows,
+        }
+
+    def alerts_summary(self, city=None, branch=None):
+        """The compute_alerts_summary dict for a scope, aggregated in the database."""
+        scope = self._scope(city, branch)
+        under = scope + [forecast.c.any_understock.is_(True)]
+        n = func.count().label("n")
+
+        totals_q = select(
+            func.count(),
+            func.coalesce(func.sum(forecast.c.any_understock.cast(Integer)), 0),
+            func.coalesce(func.sum(forecast.c.any_overstock.cast(Integer)), 0),
+        ).where(*scope)
+        products_q = (select(forecast.c.product_name, n).where(*under)
+                      .group_by(forecast.c.product_name)
+                      .order_by(n.desc(), forecast.c.product_name).limit(10))
+        stores_q = (select(forecast.c.city_name, forecast.c.branch_name, n).where(*under)
+                    .group_by(forecast.c.city_name, forecast.c.branch_name)
+                    .order_by(n.desc(), forecast.c.city_name, forecast.c.branch_name).limit(10))
+        reorder_q = (select(*[forecast.c[c] for c in REORDER_COLS], forecast.c.reorder_qty)
+                     .where(*scope, forecast.c.reorder_qty > 0)
+                     .order_by(forecast.c.reorder_qty.desc(), forecast.c.row_id).limit(20))
+
+        with self.engine.connect() as conn:
+            total, total_under, total_over = conn.execute(totals_q).one()
+            if not total and not scope:
+                return {}
+            return {
+                "total_rows": int(total),
+                "total_understock": int(total_under),
+                "total_overstock": int(total_over),
+                "top_under_products": [list(r) for r in conn.execute(products_q)],
+                "top_under_stores": [list(r) for r in conn.execute(stores_q)],
+                "reorder_list": [dict(r._mapping) for r in conn.execute(reorder_q)],
+            }
@@ -0,0 +1,80 @@
+# storage.py
+import os
+import pandas as pd
+
+from scripts.compact_forecast import COMPACT_EXT, CompactForecast
+
+# Explicit dtypes so no stage pays for type inference on load
+CATEGORY_COLS = ["city_name","company_name","branch_name","product_name"]
+ID_COLS = ["city_id","store_id","product_id"]
+ALERT_COLS = [f"day_{i}_alert" for i in range(1, 8)]
+DATE_COLS = ["dt"]
+
+# Columns the web app needs from the cleaned history (city/branch lookups)
+HISTORY_WEB_COLUMNS = ["city_id","city_name","store_id","company_name","branch_name"]
+
+COLUMNAR_EXT = ".parquet"
+
+
+def apply_dtypes(df):
+    """Categoricals for names and alerts, int32 IDs and datetime64 dates, in place."""
+    for col in CATEGORY_COLS + ALERT_COLS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    for col in ID_COLS:
+        if col in df.columns and df[col].notna().all():
+            df[col] = df[col].astype("int32")
+    for col in DATE_COLS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    return df
+
+
+def columnar_path(path):
+    """data/x.csv -> data/x.parquet"""
+    return os.path.splitext(path)[0] + COLUMNAR_EXT
+
+
+def resolve(path):
+    """
+    The memory-mappable compact copy of a CSV path if it exists (forecast
+    only), else its columnar copy, else the path itself.
+    """
+    for ext in (COMPACT_EXT, COLUMNAR_EXT):
+        binary = os.path.splitext(path)[0] + ext
+        if os.path.exists(binary):
+            return binary
+    return path
+
+
+def read_frame(path, columns=None):
+    """Read a CSV, Parquet, Feather or compact forecast file, optionally projecting `columns`."""
+    ext = os.path.splitext(path)[1]
+    if ext == COMPACT_EXT:
+        # Read-only views over the memory-mapped file, shared between processes
+        return CompactForecast.open(path).frame(columns)
+    if ext == ".parquet":
+        return pd.read_parquet(path, columns=columns)
+    if ext == ".feather":
+        return pd.read_feather(path, columns=columns)
+
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda c: c in wanted
+    dtype = {c: "category" for c in CATEGORY_COLS + ALERT_COLS}
+    df = pd.read_csv(path, usecols=usecols, dtype=dtype)
+    return apply_dtypes(df)
+
+
+def write_frame(df, path):
+    """Write by extension through a temp file, so readers never see a partial file."""
+    ext = os.path.splitext(path)[1]
+    tmp_path = path + ".tmp"
+    if ext == ".parquet":
+        apply_dtypes(df.copy()).to_parquet(tmp_path, index=False)
+    elif ext == ".feather":
+        apply_dtypes(df.copy()).reset_index(drop=True).to_feather(tmp_path)
+    else:
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
@@ -0,0 +1,298 @@
+# train_cache.py
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import xgboost as xgb
+
+from scripts.features import KEYS, _PrefixSums, add_sales_features, group_offsets, sort_series
+from scripts.storage import read_frame
+
+CACHE_DIR = "data/train_cache"
+CACHE_VERSION = 1
+TARGET_DAYS = 7
+BATCH_ROWS = 1_000_000
+
+FEATURES = [
+    "city_name_enc","store_id","company_name_enc","branch_name_enc","product_name_enc",
+    "stock_hour6_22_cnt","discount","holiday_flag","activity_flag",
+    "year","month","day","day_of_week","is_weekend",
+    "sales_lag_1","sales_ma_7","sales_ma_14"
+]
+CATEGORICAL_COLS = ["city_name","company_name","branch_name","product_name"]
+SOURCE_COLUMNS = KEYS + ["dt","sale_amount","stock_hour6_22_cnt","discount","holiday_flag",
+                         "activity_flag"] + CATEGORICAL_COLS
+
+
+class UnsortedSource(Exception):
+    pass
+
+
+def source_signature(path):
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def next_window_sum(values, offsets, window=TARGET_DAYS):
+    """
+    Sum of the next `window` values of each row within its series, matching
+    groupby(...).shift(-window).rolling(window).sum() over a frame sorted by
+    series: NaN for the last `window` rows of a series and, because the
+    rolling window spans the previous series' NaN tail, for its first
+    window - 1 rows too.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    sums = _PrefixSums(values)(values, window)
+    target = np.full(len(values), np.nan)
+    target[:-window] = sums[window:]
+    starts = np.repeat(offsets[:-1], np.diff(offsets))
+    ends = np.repeat(offsets[1:], np.diff(offsets))
+    pos = np.arange(len(values))
+    target[(pos - starts < window - 1) | (pos + window >= ends)] = np.nan
+    return target
+
+
+def _source_batches(path, batch_rows):
+    ext = os.path.splitext(path)[1]
+    if ext == ".parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=SOURCE_COLUMNS):
+            yield batch.to_pandas()
+    elif ext == ".csv":
+        yield from pd.read_csv(path, usecols=SOURCE_COLUMNS, chunksize=batch_rows)
+    else:
+        yield read_frame(path, columns=SOURCE_COLUMNS)
+
+
+def _check_sorted(batch, previous_last):
+    order = pd.MultiIndex.from_frame(batch[KEYS + ["dt"]])
+    if not order.is_unique or not order.is_monotonic_increasing:
+        raise UnsortedSource()
+    if previous_last is not None and tuple(batch[KEYS].iloc[0]) <= previous_last:
+        raise UnsortedSource()
+
+
+def iter_series_batches(batches):
+    """
+    Re-cut a stream of frames sorted by series and date so no series spans two
+    batches: each batch's trailing series is carried into the next one.
+    Raises UnsortedSource if the stream is not in that order.
+    """
+    carry, previous_last = None, None
+    for batch in batches:
+        batch["dt"] = pd.to_datetime(batch["dt"])
+        if carry is not None:
+            batch = pd.concat([carry, batch], ignore_index=True)
+        offsets = group_offsets(batch)
+        cut = offsets[-2]
+        carry = batch.iloc[cut:]
+        if cut:
+            ready = batch.iloc[:cut]
+            _check_sorted(ready, previous_last)
+            previous_last = tuple(ready[KEYS].iloc[-1])
+            yield ready
+    if carry is not None and len(carry):
+        _check_sorted(carry, previous_last)
+        yield carry
+
+
+def iter_sorted_frame(df, batch_rows):
+    """Whole-series slices of an in-memory frame, for sources not stored in series order."""
+    df = sort_series(df.assign(dt=pd.to_datetime(df["dt"]))).reset_index(drop=True)
+    offsets = group_offsets(df)
+    # Cut at the first series boundary past every multiple of batch_rows
+    cuts = offsets[np.searchsorted(offsets, np.arange(batch_rows, len(df), batch_rows))]
+    cuts = np.unique(np.r_[0, cuts, len(df)])
+    for start, end in zip(cuts[:-1], cuts[1:]):
+        yield df.iloc[start:end]
+
+
+def batch_matrix(batch, categories):
+    """
+    Feature matrix (float32, columns in FEATURES order), next-7-day target and
+    day number for one batch of whole series, with the rows xgb_train.py
+    always kept: complete lag/MA features and a defined target.
+    """
+    batch = add_sales_features(batch, lags=(1,), windows=(7,14))
+    batch = batch.dropna(subset=["sales_lag_1","sales_ma_7","sales_ma_14"])
+    target = next_window_sum(batch["sale_amount"].to_numpy(), group_offsets(batch))
+    keep = ~np.isnan(target)
+    batch = batch[keep]
+
+    dt = batch["dt"].dt
+    cols = {
+        "year": dt.year, "month": dt.month, "day": dt.day,
+        "day_of_week": dt.dayofweek, "is_weekend": dt.dayofweek.isin([5,6]).astype(int),
+    }
+    for col in CATEGORICAL_COLS:
+        cols[col+"_enc"] = pd.Categorical(batch[col], categories=categories[col]).codes
+    X = np.empty((len(batch), len(FEATURES)), dtype=np.float32)
+    for j, name in enumerate(FEATURES):
+        X[:, j] = cols[name] if name in cols else batch[name].to_numpy(dtype=np.float64)
+    days = (batch["dt"].to_numpy().astype("datetime64[D]").astype(np.int64)).astype(np.int32)
+    return X, target[keep].astype(np.float32), days
+
+
+class FeatureCache:
+    """
+    Training features built once into flat float32 files under `path`
+    (X: n x len(FEATURES), y, day) plus a manifest, and memory-mapped on load.
+    The manifest records the source file's size and mtime, so a cache built
+    from an older cleaned history is rebuilt rather than reused.
+
+    The nightly loadclean rewrites that history, so an incremental training
+    run still rebuilds the features over all of it (one streamed pass; the
+    time is logged as feature_seconds). New days cannot simply be appended:
+    rows are stored series by series, the next-7-day target of each series'
+    last days changes as days arrive, and the class codes are renumbered to
+    the classes in use.
+    """
+
+    def __init__(self, path, manifest, mode="r"):
+        self.path = path
+        self.manifest = manifest
+        n = manifest["n_rows"]
+        self.X = np.memmap(os.path.join(path, "X.f32"), np.float32, mode, shape=(n, len(FEATURES))) if n else \
+            np.empty((0, len(FEATURES)), np.float32)
+        self.y = np.memmap(os.path.join(path, "y.f32"), np.float32, "r", shape=(n,)) if n else np.empty(0, np.float32)
+        self.day = np.memmap(os.path.join(path, "day.i32"), np.int32, "r", shape=(n,)) if n else np.empty(0, np.int32)
+
+    def __len__(self):
+        return self.manifest["n_rows"]
+
+    @property
+    def classes(self):
+        return self.manifest["classes"]
+
+    @staticmethod
+    def _read_manifest(path):
+        try:
+            with open(os.path.join(path, "manifest.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def load(cls, path, source):
+        """The cache at `path` if it was built from the current `source`, else None."""
+        manifest = cls._read_manifest(path)
+        if (manifest is None or manifest.get("version") != CACHE_VERSION
+                or manifest.get("features") != FEATURES or manifest.get("source") != source_signature(source)):
+            return None
+        return cls(path, manifest)
+
+    @classmethod
+    def build(cls, source, path=CACHE_DIR, batch_rows=BATCH_ROWS):
+        """Stream `source` in whole-series batches into a new cache at `path`."""
+        # Label classes from the name columns alone; narrowed below to the
+        # classes that survive the feature/target filters, as LabelEncoder
+        # fitted on the training frame would see them
+        names = read_frame(source, columns=CATEGORICAL_COLS)
+        categories = {c: sorted(names[c].dropna().astype(str).unique()) for c in CATEGORICAL_COLS}
+        del names
+
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        used = {c: np.zeros(len(categories[c]), dtype=bool) for c in CATEGORICAL_COLS}
+        enc_idx = [FEATURES.index(c+"_enc") for c in CATEGORICAL_COLS]
+        n_rows, max_day = 0, None
+
+        def write_batches(batches):
+            nonlocal n_rows, max_day
+            with open(os.path.join(tmp_path, "X.f32"), "wb") as fx, \
+                 open(os.path.join(tmp_path, "y.f32"), "wb") as fy, \
+                 open(os.path.join(tmp_path, "day.i32"), "wb") as fd:
+                for batch in batches:
+                    X, y, day = batch_matrix(batch, categories)
+                    if not len(y):
+                        continue
+                    for col, j in zip(CATEGORICAL_COLS, enc_idx):
+                        codes = X[:, j].astype(np.int64)
+                        used[col][codes[codes >= 0]] = True
+                    X.tofile(fx)
+                    y.tofile(fy)
+                    day.tofile(fd)
+                    n_rows += len(y)
+                    max_day = int(day.max()) if max_day is None else max(max_day, int(day.max()))
+
+        try:
+            write_batches(iter_series_batches(_source_batches(source, batch_rows)))
+        except UnsortedSource:
+            print("Source is not sorted by store/product/date; sorting it in memory instead.")
+            used = {c: np.zeros(len(categories[c]), dtype=bool) for c in CATEGORICAL_COLS}
+            n_rows, max_day = 0, None
+            write_batches(iter_sorted_frame(read_frame(source, columns=SOURCE_COLUMNS), batch_rows))
+
+        manifest = {
+            "version": CACHE_VERSION,
+            "features": FEATURES,
+            "source": source_signature(source),
+            "n_rows": n_rows,
+            "max_day": max_day,
+            "classes": {c: [cat for cat, u in zip(categories[c], used[c]) if u] for c in CATEGORICAL_COLS},
+        }
+        cache = cls(tmp_path, manifest, mode="r+")
+        # Renumber codes to the surviving classes, a slice at a time
+        remap = {c: np.r_[np.cumsum(used[c]) - 1, -1].astype(np.float32) for c in CATEGORICAL_COLS}
+        for start in range(0, n_rows, batch_rows):
+            block = cache.X[start:start + batch_rows]
+            for col, j in zip(CATEGORICAL_COLS, enc_idx):
+                block[:, j] = remap[col][block[:, j].astype(np.int64)]
+        if n_rows:
+            cache.X.flush()
+        del cache
+
+        with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        return cls(path, manifest)
+
+    def split_day(self, holdout_days=7):
+        """Last training day: rows after it form the time-based test split."""
+        return self.manifest["max_day"] - holdout_days
+
+    @staticmethod
+    def _in_range(day, after, through):
+        mask = np.ones(len(day), dtype=bool)
+        if after is not None:
+            mask &= day > after
+        if through is not None:
+            mask &= day <= through
+        return mask
+
+    def iter_rows(self, after=None, through=None, batch_rows=BATCH_ROWS):
+        """(X, y) slices of the rows with after < day <= through (either bound optional), in cache order."""
+        for start in range(0, len(self), batch_rows):
+            mask = self._in_range(self.day[start:start + batch_rows], after, through)
+            if mask.any():
+                yield self.X[start:start + batch_rows][mask], self.y[start:start + batch_rows][mask]
+
+    def count_rows(self, after=None, through=None):
+        return int(np.count_nonzero(self._in_range(self.day, after, through)))
+
+
+class CacheIter(xgb.DataIter):
+    """Feeds cache slices to QuantileDMatrix/DMatrix without concatenating them."""
+
+    def __init__(self, cache, after=None, through=None, batch_rows=BATCH_ROWS, cache_prefix=None):
+        self.cache = cache
+        self.after = after
+        self.through = through
+        self.batch_rows = batch_rows
+        self._it = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def reset(self):
+        self._it = None
+
+    def next(self, input_data):
+        if self._it is None:
+            self._it = self.cache.iter_rows(self.after, self.through, self.batch_rows)
+        batch = next(self._it, None)
+        if batch is None:
+            return False
+        input_data(data=batch[0], label=batch[1], feature_names=FEATURES)
+        return True
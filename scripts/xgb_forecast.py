@@ -1,88 +1,234 @@
 import pandas as pd
 import numpy as np
 import joblib
-
-# Load model and encoders
-model = joblib.load("model/xgb_stock_forecast_model.pkl")
-label_encoders = joblib.load("label_encoders.pkl")
-
-# Load cleaned retail data
-df = pd.read_csv("data/cleaned_retail_data_with_names.csv")
-df["dt"] = pd.to_datetime(df["dt"])
-
-# Latest row per store/product
-latest_df = df.sort_values("dt").groupby(["store_id","product_id"]).tail(1).copy()
-
-# Lag features
-latest_df["sales_lag_1"] = df.groupby(["store_id","product_id"])["sale_amount"].shift(1).reindex(latest_df.index).fillna(0)
-latest_df["sales_ma_7"] = df.groupby(["store_id","product_id"])["sale_amount"].transform(lambda x: x.rolling(7).mean()).reindex(latest_df.index).fillna(0)
-latest_df["sales_ma_14"] = df.groupby(["store_id","product_id"])["sale_amount"].transform(lambda x: x.rolling(14).mean()).reindex(latest_df.index).fillna(0)
-
-# Date features
-latest_df["year"] = latest_df["dt"].dt.year
-latest_df["month"] = latest_df["dt"].dt.month
-latest_df["day"] = latest_df["dt"].dt.day
-latest_df["day_of_week"] = latest_df["dt"].dt.dayofweek
-latest_df["is_weekend"] = latest_df["day_of_week"].isin([5,6]).astype(int)
-
-# Encode categorical features for model input
-for col in ["city_name","company_name","branch_name","product_name"]:
-    le = label_encoders[col]
-    # unseen labels mapped to -1
-    latest_df[col+"_enc"] = latest_df[col].apply(lambda x: le.transform([x])[0] if x in le.classes_ else -1)
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.alerts_summary import SUMMARY_PATH, compute_all_summaries, save_summaries
+from scripts.compact_forecast import CompactForecast, compact_path
+from scripts.features import KEYS, add_sales_features, sort_series
+from scripts.inference import BACKENDS, DEFAULT_BACKEND, MODEL_PATH, load_backend
+from scripts.metrics import span
+from scripts.repository import ForecastRepository, make_engine
+from scripts.storage import columnar_path, read_frame, resolve, write_frame
+
+ENCODERS_PATH = "label_encoders.pkl"
+CLEANED_PATH = "data/cleaned_retail_data_with_names.csv"
+FORECAST_PATH = "data/stock_forecast_next_7_days_with_alerts.csv"
+# Unencoded latest features, the snapshot the web app's what-if forecasts start from
+LATEST_FEATURES_PATH = "data/latest_features.parquet"
 
 # Model features
-features = [
+FEATURES = [
     "city_name_enc","store_id","company_name_enc","branch_name_enc","product_name_enc",
     "stock_hour6_22_cnt","discount","holiday_flag","activity_flag",
     "year","month","day","day_of_week","is_weekend",
     "sales_lag_1","sales_ma_7","sales_ma_14"
 ]
+CATEGORICAL_COLS = ["city_name","company_name","branch_name","product_name"]
+ID_COLS = ["store_id","product_id","city_name","company_name","branch_name","product_name","stock_hour6_22_cnt"]
+FORECAST_DAYS = 7
+PARTITION_COLS = {"store": "store_id", "city": "city_name"}
+
+
+def latest_features(df):
+    """Latest row per store/product with lag, moving-average and date features."""
+    latest_df = df.sort_values("dt").groupby(KEYS).tail(1).copy()
+
+    # Lag features, evaluated only at each series' latest row
+    tail = add_sales_features(sort_series(df), lags=(1,), windows=(7,14), tail_only=True)
+    tail = tail.set_index(KEYS).reindex(pd.MultiIndex.from_frame(latest_df[KEYS])).fillna(0)
+    for col in ["sales_lag_1","sales_ma_7","sales_ma_14"]:
+        latest_df[col] = tail[col].to_numpy()
+
+    # Date features
+    latest_df["year"] = latest_df["dt"].dt.year
+    latest_df["month"] = latest_df["dt"].dt.month
+    latest_df["day"] = latest_df["dt"].dt.day
+    latest_df["day_of_week"] = latest_df["dt"].dt.dayofweek
+    latest_df["is_weekend"] = latest_df["day_of_week"].isin([5,6]).astype(int)
+    return latest_df
+
+
+def encode_latest(latest_df, label_encoders):
+    """A copy of latest_df with the encoded categorical features, unseen labels mapped to -1."""
+    latest_df = latest_df.copy()
+    for col in CATEGORICAL_COLS:
+        le = label_encoders[col]
+        codes = {label: i for i, label in enumerate(le.classes_)}
+        latest_df[col+"_enc"] = latest_df[col].astype(object).map(codes).fillna(-1).astype(int)
+    return latest_df
+
+
+def build_latest(df, label_encoders):
+    """Latest row per store/product with lag, moving-average, date and encoded features."""
+    return encode_latest(latest_features(df), label_encoders)
+
+
+def classify_alerts(y_pred, stock):
+    """Vectorized UNDERSTOCK / OVERSTOCK / OK thresholds for one horizon step."""
+    return np.where(y_pred > stock, "UNDERSTOCK",
+                    np.where(y_pred < stock*0.5, "OVERSTOCK", "OK"))
+
+
+def forecast_batch(model, latest_df, forecast_days=FORECAST_DAYS):
+    """
+    Recursive multi-day forecast advancing every series together:
+    one model.predict call per horizon step over the full feature matrix.
+    `model` is an XGBRegressor or any backend from scripts/inference.py.
+    """
+    X = latest_df[FEATURES].to_numpy(dtype=np.float64, copy=True)
+    stock = latest_df["stock_hour6_22_cnt"].to_numpy(dtype=np.float64)
+    lag_1 = FEATURES.index("sales_lag_1")
+    ma_7 = FEATURES.index("sales_ma_7")
+    ma_14 = FEATURES.index("sales_ma_14")
+
+    res = {c: latest_df[c].to_numpy() for c in ID_COLS}
+    for d in range(forecast_days):
+        y_pred = model.predict(X)
+        res[f"day_{d+1}_forecast"] = np.round(y_pred, 2)
+        res[f"day_{d+1}_alert"] = classify_alerts(y_pred, stock)
 
-# Forecast next 7 days
-forecast_days = 7
-results = []
+        # Update lag features
+        X[:, lag_1] = y_pred
+        X[:, ma_7] = (X[:, ma_7]*6 + y_pred)/7
+        X[:, ma_14] = (X[:, ma_14]*13 + y_pred)/14
+
+    return pd.DataFrame(res)
+
+
+def partition_series(latest_df, by="store", chunk_size=5000):
+    """
+    Split row positions of latest_df into chunks of whole stores (or cities),
+    each holding roughly chunk_size series. Chunks are built in sorted key
+    order, so the split does not depend on the number of workers.
+    """
+    groups = latest_df.groupby(PARTITION_COLS[by], sort=True, observed=True).indices
+    chunks, current, size = [], [], 0
+    for rows in groups.values():
+        current.append(rows)
+        size += len(rows)
+        if size >= chunk_size:
+            chunks.append(np.sort(np.concatenate(current)))
+            current, size = [], 0
+    if current:
+        chunks.append(np.sort(np.concatenate(current)))
+    return chunks
+
+
+_worker_model = None
+
+def _init_worker(model_path, backend):
+    # Load the model once per worker process, single-threaded so workers don't oversubscribe cores
+    global _worker_model
+    _worker_model = load_backend(backend, model_path, nthread=1)
+
+def _forecast_chunk(chunk_df):
+    return forecast_batch(_worker_model, chunk_df)
+
+
+def forecast_parallel(latest_df, model_path=MODEL_PATH, workers=2, chunk_size=5000, partition="store",
+                      backend=DEFAULT_BACKEND):
+    """
+    forecast_batch over chunks of series in a process pool. Chunk results are
+    merged back into latest_df row order as they complete, so the output is
+    identical to a serial run whatever the number of workers.
+    """
+    chunks = partition_series(latest_df, partition, chunk_size)
+    parts = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path, backend)) as pool:
+        futures = {pool.submit(_forecast_chunk, latest_df.iloc[rows]): rows for rows in chunks}
+        for future in as_completed(futures):
+            part = future.result()
+            part.index = futures[future]
+            parts.append(part)
+            print(f"  chunk done: {len(parts)}/{len(chunks)} ({len(part)} series)")
+    if not parts:
+        return forecast_batch(load_backend(backend, model_path), latest_df)
+    return pd.concat(parts).sort_index().reset_index(drop=True)
+
+
+def save_forecast(forecast_df):
+    """
+    Write the forecast files and return the values the app reads back from
+    CSV, which the summaries and the database copy are built from.
+    """
+    # Forecast columns are widened to float64 so the Parquet copy and the
+    # summaries hold the same numbers the app would read back from CSV.
+    forecast_cols = [c for c in forecast_df.columns if c.endswith("_forecast")]
+    csv_view = forecast_df.astype({c: np.float64 for c in forecast_cols}).round({c: 2 for c in forecast_cols})
+
+    # Save Parquet, CSV for download and the compact float32/int8 copy the web
+    # workers memory-map, each written to a temp file and renamed into place
+    with span("forecast.save", rows=len(forecast_df)):
+        write_frame(csv_view, columnar_path(FORECAST_PATH))
+        write_frame(forecast_df, FORECAST_PATH)
+        CompactForecast.from_frame(csv_view).write(compact_path(FORECAST_PATH))
+    print("✅ Forecast saved with original names")
+    return csv_view
+
+
+def publish_views(csv_view):
+    """Dashboard summaries and the database copy, both derived from the saved forecast."""
+    # Materialize admin and per-branch dashboard summaries
+    with span("forecast.summaries", rows=len(csv_view)):
+        save_summaries(compute_all_summaries(csv_view), SUMMARY_PATH)
+    print("✅ Alert summaries saved")
+
+    # The web app reads from the database instead of the files when one is configured
+    if os.environ.get("DATABASE_URL"):
+        repo = ForecastRepository(make_engine())
+        repo.create_schema()
+        repo.publish_forecast(csv_view)
+        print("✅ Forecast published to database")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast the next 7 days of sales per store/product.")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("FORECAST_WORKERS", 1)),
+                        help="worker processes; 1 runs in-process (default: $FORECAST_WORKERS or 1)")
+    parser.add_argument("--chunk-size", type=int, default=int(os.environ.get("FORECAST_CHUNK_SIZE", 5000)),
+                        help="approximate series per chunk (default: $FORECAST_CHUNK_SIZE or 5000)")
+    parser.add_argument("--partition", choices=sorted(PARTITION_COLS), default="store",
+                        help="keep whole stores or whole cities in one chunk")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.environ.get("FORECAST_BACKEND", DEFAULT_BACKEND),
+                        help="native booster, sklearn wrapper or treelite-compiled predictor "
+                             "(default: $FORECAST_BACKEND or booster)")
+    args = parser.parse_args()
+
+    # Load model and encoders
+    model = load_backend(args.backend)
+    label_encoders = joblib.load(ENCODERS_PATH)
+
+    # Load cleaned retail data (Parquet if loadclean.py wrote it, else CSV)
+    with span("forecast.load") as s:
+        df = read_frame(resolve(CLEANED_PATH))
+        df["dt"] = pd.to_datetime(df["dt"])
+        s.rows = len(df)
+
+    with span("forecast.features") as s:
+        latest_df = latest_features(df)
+        write_frame(latest_df, LATEST_FEATURES_PATH)
+        latest_df = encode_latest(latest_df, label_encoders)
+        s.rows = len(latest_df)
+
+    # Forecast next 7 days
+    with span("forecast.predict", rows=len(latest_df)):
+        if args.workers > 1:
+            print(f"Forecasting {len(latest_df)} series with {args.workers} workers...")
+            forecast_df = forecast_parallel(latest_df, MODEL_PATH, args.workers, args.chunk_size, args.partition,
+                                            args.backend)
+        else:
+            forecast_df = forecast_batch(model, latest_df)
 
-for idx, row in latest_df.iterrows():
-    row_copy = row.copy()
-    forecasts, alerts = [], []
+    publish_views(save_forecast(forecast_df))
 
-    for d in range(forecast_days):
-        X_pred = row_copy[features].values.reshape(1, -1)
-        y_pred = model.predict(X_pred)[0]
-        forecasts.append(round(y_pred,2))
-
-        stock = row_copy["stock_hour6_22_cnt"]
-        if y_pred > stock:
-            alerts.append("UNDERSTOCK")
-        elif y_pred < stock*0.5:
-            alerts.append("OVERSTOCK")
-        else:
-            alerts.append("OK")
 
-        # Update lag features
-        row_copy["sales_lag_1"] = y_pred
-        row_copy["sales_ma_7"] = (row_copy["sales_ma_7"]*6 + y_pred)/7
-        row_copy["sales_ma_14"] = (row_copy["sales_ma_14"]*13 + y_pred)/14
-
-    # Save results with original names
-    res = {
-        "store_id": row["store_id"],
-        "product_id": row["product_id"],
-        "city_name": row["city_name"],
-        "company_name": row["company_name"],
-        "branch_name": row["branch_name"],
-        "product_name": row["product_name"],
-        "stock_hour6_22_cnt": row["stock_hour6_22_cnt"]
-    }
-
-    for i in range(forecast_days):
-        res[f"day_{i+1}_forecast"] = forecasts[i]
-        res[f"day_{i+1}_alert"] = alerts[i]
-
-    results.append(res)
-
-# Save CSV
-forecast_df = pd.DataFrame(results)
-forecast_df.to_csv("data/stock_forecast_next_7_days_with_alerts.csv", index=False)
-print("✅ Forecast saved with original names")
+if __name__ == "__main__":
+    main()
@@ -1,78 +1,234 @@
 # xgb_train.py
-import pandas as pd
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
 import numpy as np
 from sklearn.preprocessing import LabelEncoder
-from sklearn.metrics import mean_squared_error
 import xgboost as xgb
 import joblib
 
-# 1️⃣ Load enriched data
-df = pd.read_csv("data/cleaned_retail_data_with_names.csv")
-df["dt"] = pd.to_datetime(df["dt"])
-df = df.sort_values(["store_id","product_id","dt"])
-
-# 2️⃣ Create lag features
-df["sales_lag_1"] = df.groupby(["store_id","product_id"])["sale_amount"].shift(1)
-df["sales_ma_7"] = df.groupby(["store_id","product_id"])["sale_amount"].transform(lambda x: x.rolling(7).mean())
-df["sales_ma_14"] = df.groupby(["store_id","product_id"])["sale_amount"].transform(lambda x: x.rolling(14).mean())
-
-df = df.dropna(subset=["sales_lag_1","sales_ma_7","sales_ma_14"])
-
-# 3️⃣ Target: next 7-day total sales
-df["sales_next_7"] = df.groupby(["store_id","product_id"])["sale_amount"].shift(-7).rolling(7).sum()
-df = df.dropna(subset=["sales_next_7"])
-
-# 4️⃣ Encode categorical features
-categorical_cols = ["city_name","company_name","branch_name","product_name"]
-label_encoders = {}
-for col in categorical_cols:
-    le = LabelEncoder()
-    df[col+"_enc"] = le.fit_transform(df[col])
-    label_encoders[col] = le
-
-# 5️⃣ Features and target
-features = [
-    "city_name_enc","store_id","company_name_enc","branch_name_enc","product_name_enc",
-    "stock_hour6_22_cnt","discount","holiday_flag","activity_flag",
-    "year","month","day","day_of_week","is_weekend",
-    "sales_lag_1","sales_ma_7","sales_ma_14"
-]
-
-# Add date features
-df["year"] = df["dt"].dt.year
-df["month"] = df["dt"].dt.month
-df["day"] = df["dt"].dt.day
-df["day_of_week"] = df["dt"].dt.dayofweek
-df["is_weekend"] = df["day_of_week"].isin([5,6]).astype(int)
-
-X = df[features]
-y = df["sales_next_7"]
-
-# 6️⃣ Time-based train/test split
-split_date = df["dt"].max() - pd.Timedelta(days=7)
-X_train = X[df["dt"] <= split_date]
-y_train = y[df["dt"] <= split_date]
-X_test = X[df["dt"] > split_date]
-y_test = y[df["dt"] > split_date]
-
-# 7️⃣ Train XGBoost
-xgb_model = xgb.XGBRegressor(
-    n_estimators=500,
-    learning_rate=0.1,
-    max_depth=6,
-    subsample=0.8,
-    colsample_bytree=0.8,
-    random_state=42,
-    n_jobs=-1
-)
-xgb_model.fit(X_train, y_train)
-
-# 8️⃣ Evaluate
-y_pred = xgb_model.predict(X_test)
-rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-print(f"Stock Forecasting RMSE (next 7 days): {rmse:.2f}")
-
-# 9️⃣ Save model and encoders
-joblib.dump(xgb_model, "model/xgb_stock_forecast_model.pkl")
-joblib.dump(label_encoders, "label_encoders.pkl")
-print("Model and encoders saved!")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from scripts.inference import booster_path, save_booster
+from scripts.metrics import peak_rss_mb, span
+from scripts.storage import resolve
+from scripts.train_cache import BATCH_ROWS, CACHE_DIR, CATEGORICAL_COLS, CacheIter, FeatureCache
+
+CLEANED_PATH = "data/cleaned_retail_data_with_names.csv"
+MODEL_PATH = "model/xgb_stock_forecast_model.pkl"
+ENCODERS_PATH = "label_encoders.pkl"
+TRAIN_STATE_PATH = "data/train_state.json"
+TRAIN_LOG_PATH = "data/train_log.jsonl"
+
+
+def train_params(args):
+    """XGBRegressor's settings from the original script, with the hist knobs exposed."""
+    params = {
+        "objective": "reg:squarederror",
+        "tree_method": "hist",
+        "learning_rate": 0.1,
+        "max_depth": args.max_depth,
+        "subsample": 0.8,
+        "colsample_bytree": 0.8,
+        "seed": 42,
+        "max_bin": args.max_bin,
+        "grow_policy": args.grow_policy,
+        "max_leaves": args.max_leaves,
+    }
+    if args.nthread > 0:
+        params["nthread"] = args.nthread
+    return params
+
+
+def rmse(booster, cache, split_day, batch_rows):
+    """Holdout RMSE over the rows after split_day, predicting a slice of the cache at a time."""
+    sq_err, n = 0.0, 0
+    for X, y in cache.iter_rows(after=split_day, batch_rows=batch_rows):
+        y_pred = booster.inplace_predict(X)
+        sq_err += float(np.sum((y.astype(np.float64) - y_pred) ** 2))
+        n += len(y)
+    return np.sqrt(sq_err / n) if n else float("nan")
+
+
+def load_state(path=TRAIN_STATE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_json(obj, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+def log_run(record, path=TRAIN_LOG_PATH):
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def load_production():
+    """(booster, label_encoders) of the saved model, or (None, None)."""
+    if not (os.path.exists(MODEL_PATH) and os.path.exists(ENCODERS_PATH)):
+        return None, None
+    return joblib.load(MODEL_PATH).get_booster(), joblib.load(ENCODERS_PATH)
+
+
+def same_classes(label_encoders, cache):
+    return label_encoders is not None and all(
+        list(label_encoders[col].classes_) == cache.classes[col] for col in CATEGORICAL_COLS)
+
+
+def choose_mode(args, cache, split_day, state, production, label_encoders):
+    """("full" | "incremental" | "skip", reason) for this run."""
+    if not args.incremental:
+        return "full", "full rebuild requested"
+    if production is None or state is None:
+        return "full", "no production model or training state"
+    if not same_classes(label_encoders, cache):
+        # New labels would shift every encoded feature the existing trees split on
+        return "full", "label classes changed"
+    if cache.manifest["max_day"] - state["last_full_day"] >= args.full_every_days:
+        return "full", f"scheduled, {args.full_every_days}+ days since the last full rebuild"
+    if production.num_boosted_rounds() + args.rounds > args.max_trees:
+        return "full", f"tree cap of {args.max_trees} reached"
+    if cache.count_rows(state["trained_through_day"], split_day) == 0:
+        return "skip", "no new labelled days since the last run"
+    return "incremental", f"days after {np.datetime64(state['trained_through_day'], 'D')}"
+
+
+def train_matrix(cache, args, after, through):
+    if args.external_memory:
+        prefix = os.path.join(args.cache_dir, "xgb")
+        return xgb.DMatrix(CacheIter(cache, after, through, args.batch_rows, cache_prefix=prefix))
+    return xgb.QuantileDMatrix(CacheIter(cache, after, through, args.batch_rows), max_bin=args.max_bin)
+
+
+def save_production(booster, cache, args):
+    """
+    Write the model as the XGBRegressor/LabelEncoder pair xgb_forecast.py
+    loads, plus the booster's UBJSON copy for the native backend, atomically.
+    """
+    xgb_model = xgb.XGBRegressor(n_estimators=booster.num_boosted_rounds(), learning_rate=0.1,
+                                 max_depth=args.max_depth, subsample=0.8, colsample_bytree=0.8,
+                                 random_state=42, n_jobs=-1, max_bin=args.max_bin,
+                                 grow_policy=args.grow_policy, max_leaves=args.max_leaves)
+    xgb_model.load_model(bytearray(booster.save_raw("ubj")))
+    label_encoders = {}
+    for col in CATEGORICAL_COLS:
+        le = LabelEncoder()
+        le.classes_ = np.array(cache.classes[col], dtype=object)
+        label_encoders[col] = le
+    for obj, path in [(xgb_model, MODEL_PATH), (label_encoders, ENCODERS_PATH)]:
+        joblib.dump(obj, path + ".tmp")
+        os.replace(path + ".tmp", path)
+    save_booster(booster, booster_path(MODEL_PATH))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the 7-day stock forecast model.")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="where the feature matrix is cached")
+    parser.add_argument("--rebuild-cache", action="store_true", help="rebuild features even if the cache is current")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="rows per streamed batch")
+    parser.add_argument("--external-memory", action="store_true",
+                        help="page the quantized matrix to disk (DMatrix with a cache prefix) instead of "
+                             "holding it in a QuantileDMatrix")
+    parser.add_argument("--n-estimators", type=int, default=500)
+    parser.add_argument("--max-depth", type=int, default=6)
+    parser.add_argument("--max-bin", type=int, default=256, help="hist: histogram bins per feature")
+    parser.add_argument("--grow-policy", choices=["depthwise", "lossguide"], default="depthwise",
+                        help="hist: split nodes closest to the root, or with the highest loss change")
+    parser.add_argument("--max-leaves", type=int, default=0, help="hist: leaf cap per tree (0 = none)")
+    parser.add_argument("--nthread", type=int, default=-1, help="threads (-1 = all cores)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="add boosting rounds to the production model on days it has not seen, "
+                             "falling back to a full rebuild when one is due")
+    parser.add_argument("--rounds", type=int, default=50, help="incremental: boosting rounds to add")
+    parser.add_argument("--full-every-days", type=int, default=7,
+                        help="incremental: rebuild from scratch once the data is this many days past the last full fit")
+    parser.add_argument("--max-trees", type=int, default=1500,
+                        help="incremental: rebuild from scratch instead of growing the model past this many trees")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="accept a candidate whose holdout RMSE is at most this fraction worse than production")
+    parser.add_argument("--force", action="store_true", help="replace the production model without the holdout check")
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+
+    # 1️⃣ Features: built once per cleaned-history version, then memory-mapped
+    source = resolve(CLEANED_PATH)
+    with span("train.features") as s:
+        cache = None if args.rebuild_cache else FeatureCache.load(args.cache_dir, source)
+        features = "rebuilt" if cache is None else "cached"
+        if cache is None:
+            print(f"Building feature cache from {source}...")
+            cache = FeatureCache.build(source, args.cache_dir, args.batch_rows)
+        else:
+            print(f"Using cached features ({len(cache)} rows) from {args.cache_dir}")
+        s.rows = len(cache)
+    feature_log = {"features": features, "feature_seconds": round(s.seconds, 2)}
+
+    # 2️⃣ Time-based train/holdout split: the last 7 days are held out
+    split_day = cache.split_day()
+    state = load_state()
+    production, label_encoders = load_production()
+    mode, reason = choose_mode(args, cache, split_day, state, production, label_encoders)
+    print(f"Mode: {mode} ({reason})")
+    if mode == "skip":
+        log_run({"at": datetime.now().isoformat(timespec="seconds"), "mode": mode, "reason": reason, **feature_log})
+        return
+
+    # 3️⃣ Train: every day up to the split, or only the days since the last run
+    params = train_params(args)
+    with span(f"train.{mode}") as s:
+        if mode == "full":
+            dtrain = train_matrix(cache, args, None, split_day)
+            rounds = args.n_estimators
+            candidate = xgb.train(params, dtrain, num_boost_round=rounds)
+        else:
+            dtrain = train_matrix(cache, args, state["trained_through_day"], split_day)
+            rounds = args.rounds
+            candidate = xgb.train(params, dtrain, num_boost_round=rounds, xgb_model=production)
+        s.rows = train_rows = dtrain.num_row()
+    seconds = s.seconds
+
+    # 4️⃣ Evaluate on the holdout and gate the swap against the production model
+    with span("train.evaluate"):
+        score = rmse(candidate, cache, split_day, args.batch_rows)
+        print(f"Stock Forecasting RMSE (next 7 days): {score:.2f}")
+        baseline = None
+        if production is not None and same_classes(label_encoders, cache):
+            baseline = rmse(production, cache, split_day, args.batch_rows)
+            print(f"Production model RMSE on the same holdout: {baseline:.2f}")
+    accepted = args.force or baseline is None or not score > baseline * (1 + args.tolerance)
+
+    # 5️⃣ Save model, encoders and training state
+    if accepted:
+        save_production(candidate, cache, args)
+        new_state = dict(state or {}, trained_through_day=split_day)
+        if mode == "full":
+            new_state["last_full_day"] = cache.manifest["max_day"]
+        save_json(new_state, TRAIN_STATE_PATH)
+        print("Model and encoders saved!")
+    else:
+        print("Candidate failed the holdout check; keeping the production model.")
+
+    log_run({
+        "at": datetime.now().isoformat(timespec="seconds"), "mode": mode, "reason": reason,
+        **feature_log, "train_rows": train_rows, "rounds": rounds, "train_seconds": round(seconds, 2),
+        "total_seconds": round(time.perf_counter() - start, 2), "peak_rss_mb": round(peak_rss_mb()),
+        "rmse": round(float(score), 4), "production_rmse": None if baseline is None else round(float(baseline), 4),
+        "accepted": accepted,
+    })
+    print(f"Total: {time.perf_counter() - start:.1f}s, peak RSS {peak_rss_mb():.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
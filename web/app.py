@@ -1,9 +1,31 @@
 # app.py
 import os
-import subprocess
+import sys
+import time
+import joblib
 import pandas as pd
 import numpy as np
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, jsonify
+from flask import (Flask, Response, render_template, request, redirect, url_for, session, flash,
+                   jsonify, stream_with_context, g)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from web.data_cache import DataCache, file_signature
+from web.export import EXPORT_FORMATS, export_etag, iter_export
+from web.forecast_query import ForecastQuery
+from web.jobs import ForecastJobs
+from web.store_index import StoreIndex
+from web.what_if import WhatIfForecaster
+from scripts.compact_forecast import widen_forecast
+from scripts.metrics import REGISTRY, SamplingProfiler, profile_enabled, profile_path
+from scripts.repository import ForecastRepository, make_engine
+from scripts.storage import HISTORY_WEB_COLUMNS, read_frame, resolve
+from scripts.xgb_forecast import ENCODERS_PATH, LATEST_FEATURES_PATH
+from scripts.alerts_summary import (
+    ADMIN_SCOPE, compute_alerts_summary, compute_all_summaries, load_summaries,
+)
 
 # ---------------- Configuration ----------------
 app = Flask(__name__)
@@ -12,74 +34,146 @@ app.secret_key = os.environ.get("FLASK_SECRET", "change_this_secret")
 DATA_DIR = "data"
 CLEANED_PATH = os.path.join(DATA_DIR, "cleaned_retail_data_with_names.csv")
 FORECAST_PATH = os.path.join(DATA_DIR, "stock_forecast_next_7_days_with_alerts.csv")
-FORECAST_SCRIPT = "xgb_forecast.py"
+SUMMARY_PATH = os.path.join(DATA_DIR, "alert_summaries.pkl")
+FORECAST_SCRIPT = os.path.join("scripts", "xgb_forecast.py")
+JOBS_STATE_PATH = os.path.join(DATA_DIR, "forecast_jobs.json")
+JOBS_LOCK_PATH = os.path.join(DATA_DIR, "forecast_jobs.lock")
+# SQLAlchemy URL of the published tables (scripts/publish_db.py); files are read when unset
+DATABASE_URL = os.environ.get("DATABASE_URL")
+# Bearer token required by /metrics when set
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
 
 # Demo credentials
 ADMIN_USER = "admin"
 ADMIN_PASS = "admin123"
 
 # ---------------- Utilities ----------------
-def safe_read_csv(path):
-    if not os.path.exists(path):
-        return pd.DataFrame()
-    return pd.read_csv(path)
+def read_history(path):
+    # Only the city/store columns are shown, so project them at load time
+    return read_frame(path, columns=HISTORY_WEB_COLUMNS)
+
+# Parsed frames shared by all requests in this worker; reloaded on file change.
+# Parquet copies are preferred over the CSVs when present.
+data_cache = DataCache(loader=read_frame)
+
+# Background forecast runs; the cache also notices the new files by mtime
+forecast_jobs = ForecastJobs(FORECAST_SCRIPT, JOBS_STATE_PATH, JOBS_LOCK_PATH,
+                             on_finish=lambda: data_cache.invalidate(resolve(FORECAST_PATH)))
+
+# Indexed, pooled database reads for lookups, dashboard and forecast pages
+repo = ForecastRepository(make_engine(DATABASE_URL)) if DATABASE_URL else None
 
 def load_data():
-    df = safe_read_csv(CLEANED_PATH)
-    fc = safe_read_csv(FORECAST_PATH)
+    start = time.perf_counter()
+    df = data_cache.get(resolve(CLEANED_PATH), loader=read_history)
+    fc = data_cache.get(resolve(FORECAST_PATH))
+    LOAD_DATA_SECONDS.observe(time.perf_counter() - start)
     return df, fc
 
-def extract_store_list(df):
-    if df.empty:
-        return [], []
-    cities = df[["city_id", "city_name"]].drop_duplicates().sort_values("city_name")
-    stores = df[["city_id", "city_name", "store_id", "company_name", "branch_name"]].drop_duplicates()
-    return cities, stores
-
-def compute_alerts_summary(forecast_df, filter_city=None, filter_branch=None):
-    if forecast_df.empty:
-        return {}
-    df = forecast_df.copy()
-    if filter_city:
-        df = df[df["city_name"] == filter_city]
-    if filter_branch:
-        df = df[df["branch_name"] == filter_branch]
-
-    alert_cols = [c for c in df.columns if c.endswith("_alert")]
-    understock_mask = np.column_stack([df[c] == "UNDERSTOCK" for c in alert_cols]).any(axis=1)
-    overstock_mask = np.column_stack([df[c] == "OVERSTOCK" for c in alert_cols]).any(axis=1)
-
-    under = df[understock_mask]
-    over = df[overstock_mask]
-
-    top_under_products = under.groupby("product_name").size().sort_values(ascending=False).head(10)
-    top_under_stores = under.groupby(["city_name","branch_name"]).size().sort_values(ascending=False).head(10)
-
-    forecast_cols = [c for c in df.columns if c.startswith("day_") and c.endswith("_forecast")]
-
-    def calc_reorder(row):
-        future = row[forecast_cols].values.astype(float)
-        return max(0, round(float(future.max() - row["stock_hour6_22_cnt"]),2))
-
-    df["reorder_qty"] = df.apply(calc_reorder, axis=1)
-    reorder_list = df[df["reorder_qty"] > 0].sort_values("reorder_qty", ascending=False).head(20)
-
-    summary = {
-        "total_rows": len(df),
-        "total_understock": len(under),
-        "total_overstock": len(over),
-        "top_under_products": top_under_products.reset_index().values.tolist(),
-        "top_under_stores": top_under_stores.reset_index().values.tolist(),
-        "reorder_list": reorder_list[["store_id","product_id","city_name","branch_name","product_name","stock_hour6_22_cnt","reorder_qty"]].to_dict(orient="records")
-    }
-    return summary
+def load_index():
+    # Rebuilt only when either CSV is reloaded
+    df, fc = load_data()
+    return data_cache.get_derived("store_index", StoreIndex, df, fc)
+
+def build_query(fc, index):
+    query = ForecastQuery(fc, index)
+    # Pre-sort the admin /alerts view so its first page is a slice too
+    query.view(alert="UNDERSTOCK", sort="city_name,branch_name")
+    return query
+
+def load_query():
+    # Sorted/filtered views are cached per forecast version
+    index = load_index()
+    _, fc = load_data()
+    return data_cache.get_derived("forecast_query", lambda fc: build_query(fc, index), fc)
+
+def load_forecast_source():
+    # Both expose page(page, page_size, city, branch, alert, sort)
+    return repo if repo else load_query()
+
+def load_what_if():
+    # Rebuilt when the forecast run writes a new feature snapshot or encoders;
+    # None until one has run
+    latest = data_cache.get(LATEST_FEATURES_PATH)
+    if latest.empty or not os.path.exists(ENCODERS_PATH):
+        return None
+    encoders = data_cache.get(ENCODERS_PATH, loader=joblib.load)
+    return data_cache.get_derived("what_if", WhatIfForecaster, latest, encoders)
+
+def manager_scope():
+    if session.get("role") != "manager":
+        return None, None
+    return session.get("scope_city"), session.get("scope_branch")
+
+def build_summaries(fc):
+    # Prefer the summaries written alongside the forecast; recompute if stale
+    stored = load_summaries(SUMMARY_PATH, FORECAST_PATH)
+    if stored is not None:
+        return stored
+    return compute_all_summaries(fc)
+
+def load_scope_summary(fc, city=None, branch=None):
+    summaries = data_cache.get_derived("alert_summaries", build_summaries, fc)
+    scope = (city, branch) if city and branch else ADMIN_SCOPE
+    if scope in summaries:
+        return summaries[scope]
+    return compute_alerts_summary(fc, filter_city=city, filter_branch=branch)
+
+def warm_caches():
+    # Parse the files and build the indexes, views and summaries ahead of the
+    # requests that need them (web/asgi.py: at startup and in background reloads)
+    _, fc = load_data()
+    load_query()
+    data_cache.get_derived("alert_summaries", build_summaries, fc)
+    load_what_if()
+
+# ---------------- Metrics ----------------
+# Per-worker values: each gunicorn worker serves its own /metrics
+REQUEST_SECONDS = REGISTRY.histogram("http_request_duration_seconds", "Latency of Flask routes.",
+                                     ["endpoint","method","status"])
+LOAD_DATA_SECONDS = REGISTRY.histogram("load_data_seconds", "Time in load_data(), including any reload.")
+
+def data_cache_metrics():
+    stats = data_cache.stats()
+    lines = []
+    for key in ("hits", "misses", "reloads"):
+        lines += [f"# HELP data_cache_{key}_total DataCache {key} for parsed files.",
+                  f"# TYPE data_cache_{key}_total counter",
+                  f"data_cache_{key}_total {stats[key]}"]
+    lines += ["# HELP data_cache_entries Files held by the DataCache.",
+              "# TYPE data_cache_entries gauge",
+              f"data_cache_entries {stats['entries']}"]
+    return lines
+
+REGISTRY.add_collector(data_cache_metrics)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Opt-in sampling profile of the routes named in $PROFILE
+    g.profiler = SamplingProfiler().start() if profile_enabled(request.endpoint or "") else None
+
+@app.after_request
+def record_status(response):
+    g.status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request(exc):
+    # Runs after a streamed body has been sent, so exports are timed in full
+    start = g.pop("request_start", None)
+    if start is None:
+        return
+    REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=request.endpoint or "unmatched",
+                            method=request.method, status=g.pop("status", 500))
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.stop()
+        profiler.write(profile_path(request.endpoint))
 
 # ---------------- Routes ----------------
 @app.route("/", methods=["GET","POST"])
 def login():
-    df, fc = load_data()
-    cities, stores = extract_store_list(df)
-
     if request.method == "POST":
         username = request.form.get("username")
         password = request.form.get("password")
@@ -106,29 +200,34 @@ def login():
             else:
                 flash("Enter username, password, city and branch for manager login.", "danger")
 
+    if repo:
+        cities, stores = repo.cities(), repo.stores()
+    else:
+        index = load_index()
+        cities, stores = index.cities, index.stores
     return render_template("login.html",
-                           cities=cities.to_dict(orient="records"),
-                           stores=stores.to_dict(orient="records"))
+                           cities=cities,
+                           stores=stores)
 
 @app.route("/get_branches_for_city")
 def get_branches_for_city():
     city = request.args.get("city")
-    df, _ = load_data()
-    if df.empty:
-        return jsonify([])
-    branches = df[df["city_name"]==city][["branch_name","store_id","company_name"]].drop_duplicates().sort_values("branch_name")
-    return jsonify(branches.to_dict(orient="records"))
+    if repo:
+        return jsonify(repo.branches_for_city(city))
+    return jsonify(load_index().branches_for_city(city))
 
 @app.route("/dashboard")
 def dashboard():
     if not session.get("logged_in"):
         return redirect(url_for("login"))
-    df, fc = load_data()
-
-    scope_city = session.get("scope_city") if session.get("role")=="manager" else None
-    scope_branch = session.get("scope_branch") if session.get("role")=="manager" else None
-
-    summary = compute_alerts_summary(fc, filter_city=scope_city, filter_branch=scope_branch)
+    scope_city, scope_branch = manager_scope()
+    if repo:
+        preview_table = repo.preview(scope_city, scope_branch, limit=50)
+        summary = repo.alerts_summary(scope_city, scope_branch)
+    else:
+        _, fc = load_data()
+        preview_table = load_index().scope(fc, scope_city, scope_branch)
+        summary = load_scope_summary(fc, scope_city, scope_branch)
 
     top_products = summary.get("top_under_products", [])
     prod_names = [x[0] for x in top_products]
@@ -138,13 +237,7 @@ def dashboard():
     store_labels = [f"{x[0]} / {x[1]}" for x in top_stores]
     store_counts = [int(x[2]) for x in top_stores]
 
-    preview_table = fc.copy()
-    if scope_city:
-        preview_table = preview_table[preview_table["city_name"]==scope_city]
-    if scope_branch:
-        preview_table = preview_table[preview_table["branch_name"]==scope_branch]
-
-    preview_html = preview_table.head(50).to_html(classes="table table-sm table-hover", index=False)
+    preview_html = widen_forecast(preview_table.head(50)).to_html(classes="table table-sm table-hover", index=False)
 
     return render_template("dashboard.html",
                            role=session.get("role"),
@@ -154,63 +247,158 @@ def dashboard():
                            prod_counts=prod_counts,
                            store_labels=store_labels,
                            store_counts=store_counts,
-                           preview_table=preview_html)
+                           preview_table=preview_html,
+                           forecast_job=forecast_jobs.current())
 
 @app.route("/predictions")
 def predictions():
     if not session.get("logged_in"):
         return redirect(url_for("login"))
-    df, fc = load_data()
-    scope_city = session.get("scope_city") if session.get("role")=="manager" else None
-    scope_branch = session.get("scope_branch") if session.get("role")=="manager" else None
-    table = fc.copy()
-    if scope_city:
-        table = table[table["city_name"]==scope_city]
-    if scope_branch:
-        table = table[table["branch_name"]==scope_branch]
-    cols_order = ["store_id","product_id","city_name","company_name","branch_name","product_name","stock_hour6_22_cnt"]
-    for c in table.columns:
-        if c not in cols_order:
-            cols_order.append(c)
-    table = table[cols_order]
-    table_html = table.to_html(classes="table table-sm table-striped", index=False)
-    return render_template("predictions.html", table_html=table_html)
+    # Rows are fetched page by page from /api/forecast
+    return render_template("predictions.html")
 
 @app.route("/alerts")
 def alerts():
     if not session.get("logged_in"):
         return redirect(url_for("login"))
-    _, fc = load_data()
-    if fc.empty:
+    no_forecast = repo.count() == 0 if repo else load_data()[1].empty
+    if no_forecast:
         flash("No forecast found.", "warning")
         return redirect(url_for("dashboard"))
-    alert_cols = [c for c in fc.columns if c.endswith("_alert")]
-    mask = np.column_stack([fc[c]=="UNDERSTOCK" for c in alert_cols]).any(axis=1)
-    under = fc[mask].sort_values(["city_name","branch_name"])
-    return render_template("alerts.html", table_html=under.to_html(classes="table table-sm table-striped", index=False))
+    return render_template("alerts.html")
+
+@app.route("/api/forecast")
+def forecast_api():
+    if not session.get("logged_in"):
+        return jsonify({"error": "login required"}), 401
+    city, branch = manager_scope()
+    if session.get("role") != "manager":
+        city, branch = request.args.get("city"), request.args.get("branch")
+    try:
+        result = load_forecast_source().page(
+            page=request.args.get("page", 1),
+            page_size=request.args.get("page_size", 50),
+            city=city, branch=branch,
+            alert=request.args.get("alert"),
+            sort=request.args.get("sort"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+@app.route("/api/what_if", methods=["POST"])
+def what_if_api():
+    # Re-forecast one store with changed stock, discount or flags, without a full run
+    if not session.get("logged_in"):
+        return jsonify({"error": "login required"}), 401
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or "store_id" not in body:
+        return jsonify({"error": "expected a JSON object with store_id"}), 400
+    forecaster = load_what_if()
+    if forecaster is None:
+        return jsonify({"error": "no feature snapshot yet; run a forecast first"}), 503
+    city, branch = manager_scope()
+    try:
+        # Managers may only re-forecast their own branch
+        if city and forecaster.store_scope(body["store_id"]) != (city, branch):
+            return jsonify({"error": "store outside your branch"}), 403
+        result = forecaster.forecast(body["store_id"], body.get("product_ids"),
+                                     body.get("overrides"), body.get("product_overrides"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify(result)
+
+def submit_forecast_job():
+    if not os.path.exists(FORECAST_SCRIPT):
+        return None, False, f"Forecast script not found: {FORECAST_SCRIPT}"
+    job, started = forecast_jobs.submit()
+    return job, started, None
 
 @app.route("/run_forecast", methods=["POST"])
 def run_forecast():
     if not session.get("logged_in"):
         return redirect(url_for("login"))
-    try:
-        if not os.path.exists(FORECAST_SCRIPT):
-            flash(f"Forecast script not found: {FORECAST_SCRIPT}", "danger")
-            return redirect(url_for("dashboard"))
-        subprocess.run(["python", FORECAST_SCRIPT], check=True)
-        flash("Forecast completed successfully.", "success")
-    except subprocess.CalledProcessError as e:
-        flash(f"Forecast script failed: {e}", "danger")
+    job, started, error = submit_forecast_job()
+    if error:
+        flash(error, "danger")
+    elif started:
+        flash(f"Forecast started in the background (job {job['id']}).", "success")
+    else:
+        flash("A forecast is already running; this page will pick up its results.", "info")
     return redirect(url_for("dashboard"))
 
+@app.route("/api/forecast_jobs", methods=["GET","POST"])
+def forecast_jobs_api():
+    if not session.get("logged_in"):
+        return jsonify({"error": "login required"}), 401
+    if request.method == "POST":
+        job, started, error = submit_forecast_job()
+        if error:
+            return jsonify({"error": error}), 500
+        return jsonify({"job": job, "joined": not started}), 202
+    return jsonify({"current": forecast_jobs.current(), "history": forecast_jobs.history()})
+
+@app.route("/api/forecast_jobs/<job_id>")
+def forecast_job_status(job_id):
+    if not session.get("logged_in"):
+        return jsonify({"error": "login required"}), 401
+    job = forecast_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job)
+
 @app.route("/download_forecast")
 def download_forecast():
     if not session.get("logged_in"):
         return redirect(url_for("login"))
-    if not os.path.exists(FORECAST_PATH):
+    _, fc = load_data()
+    if fc.empty:
         flash("No forecast file available.", "warning")
         return redirect(url_for("dashboard"))
-    return send_file(FORECAST_PATH, as_attachment=True)
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"unknown format: {fmt}"}), 400
+    city, branch = manager_scope()
+    if session.get("role") != "manager":
+        city, branch = request.args.get("city"), request.args.get("branch")
+    alert = request.args.get("alert")
+    columns = [c for c in request.args.get("columns", "").split(",") if c] or list(fc.columns)
+    unknown = [c for c in columns if c not in fc.columns]
+    if unknown:
+        return jsonify({"error": f"unknown columns: {', '.join(unknown)}"}), 400
+
+    # Same forecast version and filters -> same ETag, so clients can skip the download
+    etag = export_etag(file_signature(resolve(FORECAST_PATH)), fmt=fmt, city=city,
+                       branch=branch, alert=alert, columns=",".join(columns))
+    if etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    try:
+        rows = load_query().view(city=city, branch=branch, alert=alert)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    mimetype, ext = EXPORT_FORMATS[fmt]
+    filename = os.path.splitext(os.path.basename(FORECAST_PATH))[0] + ext
+    return Response(stream_with_context(iter_export(fc, rows, columns, fmt)), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}",
+                             "ETag": f'"{etag}"',
+                             "Cache-Control": "private, no-cache"})
+
+@app.route("/cache_stats")
+def cache_stats():
+    if not session.get("logged_in"):
+        return redirect(url_for("login"))
+    return jsonify(data_cache.stats())
+
+@app.route("/metrics")
+def metrics():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response(status=401)
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/logout")
 def logout():
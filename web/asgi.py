@@ -0,0 +1,213 @@
+# asgi.py
+import os
+import io
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from web.app import app as flask_app, data_cache, warm_caches
+from scripts.metrics import REGISTRY
+
+# Routes that filter, sort or render forecast frames run on their own small
+# pool, so login, dropdowns and job polling never queue behind them
+HEAVY_PATHS = {"/dashboard", "/predictions", "/alerts", "/api/forecast", "/api/what_if", "/download_forecast"}
+HEAVY_THREADS = int(os.environ.get("ASGI_HEAVY_THREADS", os.cpu_count() or 2))
+LIGHT_THREADS = int(os.environ.get("ASGI_LIGHT_THREADS", 8))
+# Seconds between checks for changed data files
+RELOAD_INTERVAL = float(os.environ.get("DATA_RELOAD_INTERVAL", 2))
+
+IN_FLIGHT = REGISTRY.gauge("asgi_requests_in_flight", "Requests queued or running per executor.", ["pool"])
+RELOAD_SECONDS = REGISTRY.histogram("data_reload_seconds", "Background reloads of changed data files.")
+
+
+def build_environ(scope, body):
+    """PEP 3333 environ for an ASGI HTTP scope and its request body."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def run_wsgi(wsgi_app, environ, send, disconnected):
+    """
+    Call the WSGI app in an executor thread. `send` blocks until the event
+    loop has sent each message, so a slow client holds back a streamed export
+    instead of buffering it. Once the `disconnected` event is set the rest of
+    the body is not generated: the iterator is closed and the thread freed.
+    """
+    start = {}
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and start.get("sent"):
+            raise exc_info[1].with_traceback(exc_info[2])
+        start["message"] = {
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers],
+        }
+
+    def send_start():
+        if not start.get("sent"):
+            send(start["message"])
+            start["sent"] = True
+
+    result = wsgi_app(environ, start_response)
+    try:
+        for chunk in result:
+            if disconnected.is_set():
+                return
+            if chunk:
+                send_start()
+                send({"type": "http.response.body", "body": chunk, "more_body": True})
+        send_start()
+        send({"type": "http.response.body", "body": b"", "more_body": False})
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+
+
+class AsgiApp:
+    """
+    The Flask app behind an ASGI server: same routes, templates and sessions.
+
+    Each request runs in a bounded thread pool, heavy forecast routes in one
+    sized to the cores and everything else in another, while the event loop
+    only moves bytes. The lifespan startup parses the data files before the
+    first request and starts a task that reloads changed files in the
+    background (DataCache.refresh), so no request waits for a reload.
+    """
+
+    def __init__(self, wsgi_app, heavy_threads=HEAVY_THREADS, light_threads=LIGHT_THREADS,
+                 reload_interval=RELOAD_INTERVAL):
+        self.wsgi_app = wsgi_app
+        self.pools = {
+            "heavy": ThreadPoolExecutor(heavy_threads, thread_name_prefix="asgi-heavy"),
+            "light": ThreadPoolExecutor(light_threads, thread_name_prefix="asgi-light"),
+            "reload": ThreadPoolExecutor(1, thread_name_prefix="asgi-reload"),
+        }
+        self.reload_interval = reload_interval
+        self.in_flight = {"heavy": 0, "light": 0}
+        self._lock = threading.Lock()
+        self._reloader = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+
+    # ---------------- HTTP ----------------
+    def _track(self, pool, delta):
+        with self._lock:
+            self.in_flight[pool] += delta
+            IN_FLIGHT.set(self.in_flight[pool], pool=pool)
+
+    async def http(self, scope, receive, send):
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        loop = asyncio.get_running_loop()
+        disconnected = threading.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        pool = "heavy" if scope["path"] in HEAVY_PATHS else "light"
+        self._track(pool, 1)
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await loop.run_in_executor(self.pools[pool], run_wsgi, self.wsgi_app,
+                                       build_environ(scope, body), send_sync, disconnected)
+        finally:
+            watcher.cancel()
+            self._track(pool, -1)
+
+    # ---------------- Lifespan ----------------
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            await loop.run_in_executor(self.pools["reload"], warm_caches)
+            print(f"Data loaded in {time.perf_counter() - start:.1f}s")
+        except Exception:
+            # Serve anyway; the pages report missing data as in the sync app
+            traceback.print_exc()
+        # Only with the reload task running may requests stop reloading files themselves
+        data_cache.background = True
+        self._reloader = asyncio.create_task(self.reload_forever())
+
+    async def reload_forever(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            start = time.perf_counter()
+            try:
+                reloaded = await loop.run_in_executor(self.pools["reload"], data_cache.refresh, warm_caches)
+            except Exception:
+                traceback.print_exc()
+                continue
+            if reloaded:
+                RELOAD_SECONDS.observe(time.perf_counter() - start)
+                print(f"Reloaded {', '.join(reloaded)} in {time.perf_counter() - start:.1f}s")
+
+    async def shutdown(self):
+        if self._reloader is not None:
+            self._reloader.cancel()
+        data_cache.background = False
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# uvicorn web.asgi:app --workers 2
+# gunicorn -k uvicorn.workers.UvicornWorker web.asgi:app
+app = AsgiApp(flask_app)
@@ -0,0 +1,173 @@
+# data_cache.py
+import os
+import threading
+import pandas as pd
+
+# Shared placeholder for missing files, so derived values keyed on it stay cached.
+_EMPTY = pd.DataFrame()
+
+
+def file_signature(path):
+    """(mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class DataCache:
+    """
+    Process-wide cache of parsed DataFrames keyed by file path.
+
+    A frame is re-read only when the file's mtime/size changes or the entry is
+    invalidated explicitly (e.g. after a forecast run). Returned frames are
+    shared between requests and threads, so callers must treat them as
+    read-only and copy before mutating.
+
+    With background=True a changed file is not reloaded by the request that
+    notices it: requests keep the frames they have until refresh(), run off
+    the request path, has loaded the new ones and swapped them in.
+    """
+
+    def __init__(self, loader=pd.read_csv, background=False):
+        self._loader = loader
+        self.background = background
+        self._entries = {}      # path -> (signature, frame)
+        self._loaders = {}      # path -> loader it was read with
+        self._derived = {}      # name -> (source frames, value)
+        self._previous = {}     # name -> (source frames, value) replaced by the last swap
+        self._staging = threading.local()
+        self._path_locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def _lock_for(self, path):
+        with self._lock:
+            return self._path_locks.setdefault(path, threading.Lock())
+
+    def get(self, path, loader=None):
+        sig = file_signature(path)
+        if sig is None:
+            return _EMPTY
+
+        staged = getattr(self._staging, "entries", None)
+        if staged is not None and path in staged:
+            return staged[path][1]
+
+        entry = self._entries.get(path)
+        if entry is not None and (entry[0] == sig or self.background):
+            with self._lock:
+                self.hits += 1
+            return entry[1]
+
+        # Only one thread parses a given file; the others wait and reuse it.
+        with self._lock_for(path):
+            entry = self._entries.get(path)
+            sig = file_signature(path)
+            if sig is None:
+                return _EMPTY
+            if entry is not None and (entry[0] == sig or self.background):
+                with self._lock:
+                    self.hits += 1
+                return entry[1]
+
+            frame = (loader or self._loader)(path)
+            with self._lock:
+                if entry is None:
+                    self.misses += 1
+                else:
+                    self.reloads += 1
+                self._entries[path] = (sig, frame)
+                self._loaders[path] = loader
+            return frame
+
+    def get_derived(self, name, build, *frames):
+        """
+        Value computed by build(*frames) from frames returned by get(), rebuilt
+        only when one of those frames has been reloaded.
+        """
+        staged = getattr(self._staging, "derived", None)
+        if staged is not None:
+            # Building the next version inside refresh(); kept out of sight until the swap
+            for entry in (staged.get(name), self._derived.get(name)):
+                if entry is not None and all(a is b for a, b in zip(entry[0], frames)):
+                    return entry[1]
+            value = build(*frames)
+            staged[name] = (frames, value)
+            return value
+
+        # A request that read its frames just before a refresh() swap still
+        # finds the value built from them
+        for entry in (self._derived.get(name), self._previous.get(name)):
+            if entry is not None and all(a is b for a, b in zip(entry[0], frames)):
+                return entry[1]
+
+        with self._lock_for(("derived", name)):
+            entry = self._derived.get(name)
+            if entry is not None and all(a is b for a, b in zip(entry[0], frames)):
+                return entry[1]
+            value = build(*frames)
+            # In background mode a request can still hold frames an earlier
+            # swap replaced; a value built from them must not displace the
+            # current one
+            if not self.background or self._is_current(frames):
+                self._derived[name] = (frames, value)
+            return value
+
+    def _is_current(self, frames):
+        current = [frame for _, frame in self._entries.values()]
+        return all(f is _EMPTY or any(f is c for c in current) for f in frames)
+
+    def refresh(self, warm=None):
+        """
+        Reload every cached file that changed on disk, call warm() to rebuild
+        the values derived from them, then swap the new frames and values in
+        together. Until the swap, requests keep getting the previous ones.
+        Returns the reloaded paths. Meant for one background thread.
+        """
+        stale = [path for path, (sig, _) in list(self._entries.items()) if file_signature(path) != sig]
+        if not stale:
+            return []
+
+        entries = {}
+        for path in stale:
+            sig = file_signature(path)
+            if sig is not None:
+                entries[path] = (sig, (self._loaders.get(path) or self._loader)(path))
+        self._staging.entries, self._staging.derived = entries, {}
+        try:
+            if warm is not None:
+                warm()
+            derived = self._staging.derived
+        finally:
+            self._staging.entries = self._staging.derived = None
+
+        with self._lock:
+            self._previous = {name: self._derived[name] for name in derived if name in self._derived}
+            self._entries = {**self._entries, **entries}
+            self._derived = {**self._derived, **derived}
+            self.reloads += len(entries)
+        return list(entries)
+
+    def invalidate(self, path=None):
+        """Force the next get() to reload `path`, or every entry if None."""
+        with self._lock:
+            if path is None:
+                stale = list(self._entries)
+            else:
+                stale = [path] if path in self._entries else []
+            for p in stale:
+                # Keep the frame so the reload is still counted as a reload.
+                self._entries[p] = (None, self._entries[p][1])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,79 @@
+# export.py
+import zlib
+import hashlib
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from scripts.compact_forecast import widen_forecast
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "csv.gz": ("application/gzip", ".csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+CHUNK_ROWS = 20000
+
+
+def export_etag(version, **params):
+    """Strong ETag for one forecast version plus the export filters."""
+    key = repr((version, sorted(params.items())))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def iter_csv(df, rows, columns, chunk_rows=CHUNK_ROWS):
+    """CSV text for df.iloc[rows][columns], a chunk of rows at a time."""
+    yield df.iloc[:0][columns].to_csv(index=False)
+    for i in range(0, len(rows), chunk_rows):
+        yield df.iloc[rows[i:i + chunk_rows]][columns].to_csv(index=False, header=False)
+
+
+def iter_gzip(chunks, level=6):
+    gz = zlib.compressobj(level, zlib.DEFLATED, 31)   # wbits=31: gzip container
+    for chunk in chunks:
+        data = gz.compress(chunk.encode())
+        if data:
+            yield data
+    yield gz.flush()
+
+
+class _Sink:
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def iter_parquet(df, rows, columns, chunk_rows=CHUNK_ROWS):
+    """Parquet file bytes, one row group per chunk of rows."""
+    sink = _Sink()
+    schema = pa.Schema.from_pandas(widen_forecast(df.iloc[:0][columns]), preserve_index=False)
+    writer = pq.ParquetWriter(sink, schema)
+    for i in range(0, len(rows), chunk_rows):
+        chunk = widen_forecast(df.iloc[rows[i:i + chunk_rows]][columns])
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def iter_export(df, rows, columns, fmt):
+    if fmt == "parquet":
+        return iter_parquet(df, rows, columns)
+    if fmt == "csv.gz":
+        return iter_gzip(iter_csv(df, rows, columns))
+    return (chunk.encode() for chunk in iter_csv(df, rows, columns))
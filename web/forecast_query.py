@@ -0,0 +1,116 @@
+# forecast_query.py
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+from scripts.compact_forecast import widen_forecast
+
+ALERT_VALUES = ("UNDERSTOCK", "OVERSTOCK", "OK")
+MAX_PAGE_SIZE = 500
+# Row-position arrays kept per worker; one unfiltered view of a 1M-row forecast is 8 MB
+MAX_VIEW_BYTES = 64 * 1024 * 1024
+
+
+class ForecastQuery:
+    """
+    Filtered, sorted and paginated access to one version of the forecast frame.
+
+    Alert masks and per-column sort keys are computed once; the ordered row
+    positions for each (scope, alert, sort) combination are computed on first
+    use and kept in an LRU bounded by the bytes of those arrays, so paging
+    through a view only slices an array and materializes page_size rows.
+    """
+
+    def __init__(self, forecast_df, index, max_view_bytes=MAX_VIEW_BYTES):
+        self.df = forecast_df
+        self.index = index
+        self.columns = list(forecast_df.columns)
+        self.max_view_bytes = max_view_bytes
+        self._views = OrderedDict()
+        self._view_bytes = 0
+        self._sort_keys = {}
+        self._lock = threading.Lock()
+
+        # Compared column by column, so categorical alerts compare codes
+        # instead of materializing an object matrix
+        self.alert_masks = {a: np.zeros(len(forecast_df), dtype=bool) for a in ALERT_VALUES}
+        for col in (c for c in self.columns if c.endswith("_alert")):
+            for a in ALERT_VALUES:
+                self.alert_masks[a] |= (forecast_df[col] == a).to_numpy()
+
+    def _sort_key(self, col):
+        """Numeric values, or sorted-category codes with missing values last."""
+        key = self._sort_keys.get(col)
+        if key is None:
+            s = self.df[col]
+            if pd.api.types.is_numeric_dtype(s.dtype):
+                key = s.to_numpy(dtype=np.float64)
+            else:
+                codes, uniques = pd.factorize(s, sort=True)
+                key = np.where(codes < 0, len(uniques), codes).astype(np.float64)
+            self._sort_keys[col] = key
+        return key
+
+    def parse_sort(self, sort):
+        """'city_name,-day_1_forecast' -> (("city_name", False), ("day_1_forecast", True))"""
+        keys = []
+        for part in (sort or "").split(","):
+            part = part.strip()
+            if not part:
+                continue
+            desc = part.startswith("-")
+            col = part.lstrip("-")
+            if col not in self.columns:
+                raise ValueError(f"unknown sort column: {col}")
+            keys.append((col, desc))
+        return tuple(keys)
+
+    def _build_view(self, city, branch, alert, sort_keys):
+        rows = self.index.forecast_rows(city, branch)
+        if rows is None:
+            rows = np.arange(len(self.df))
+        if alert:
+            rows = rows[self.alert_masks[alert][rows]]
+        if sort_keys:
+            # lexsort takes the primary key last; stable, so ties keep frame order
+            arrays = [-self._sort_key(c)[rows] if desc else self._sort_key(c)[rows]
+                      for c, desc in reversed(sort_keys)]
+            rows = rows[np.lexsort(arrays)]
+        return rows
+
+    def view(self, city=None, branch=None, alert=None, sort=None):
+        """Ordered positional rows of the forecast frame for a filter/sort combination."""
+        if alert and alert not in ALERT_VALUES:
+            raise ValueError(f"unknown alert: {alert}")
+        sort_keys = self.parse_sort(sort)
+        key = (city or None, branch or None, alert or None, sort_keys)
+        with self._lock:
+            rows = self._views.get(key)
+            if rows is not None:
+                self._views.move_to_end(key)
+                return rows
+        rows = self._build_view(city, branch, alert, sort_keys)
+        with self._lock:
+            if key not in self._views:
+                self._views[key] = rows
+                self._view_bytes += rows.nbytes
+            # The newest view is kept even when it alone is over the limit
+            while self._view_bytes > self.max_view_bytes and len(self._views) > 1:
+                self._view_bytes -= self._views.popitem(last=False)[1].nbytes
+        return rows
+
+    def page(self, page=1, page_size=50, **filters):
+        rows = self.view(**filters)
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        page = max(1, int(page))
+        chunk = widen_forecast(self.df.iloc[rows[(page - 1) * page_size: page * page_size]])
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        return {
+            "total": int(len(rows)),
+            "page": page,
+            "page_size": page_size,
+            "pages": int(-(-len(rows) // page_size)),
+            "columns": self.columns,
+            "rows": chunk.values.tolist(),
+        }
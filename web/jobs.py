@@ -0,0 +1,154 @@
+# jobs.py
+import os
+import sys
+import json
+import time
+import uuid
+import fcntl
+import threading
+import subprocess
+from datetime import datetime
+
+ACTIVE_STATES = ("queued", "running")
+
+
+class ForecastJobs:
+    """
+    Runs the forecast script in the background, one run at a time.
+
+    Job state lives in a small JSON file and a run holds an exclusive flock,
+    so every gunicorn worker sees the same current job and concurrent submits,
+    from any worker, join the running job instead of starting another one.
+    The script writes its outputs to temp files and renames them into place,
+    so readers only ever see a complete forecast.
+    """
+
+    def __init__(self, script, state_path, lock_path, on_finish=None, history_size=50):
+        self.script = script
+        self.state_path = state_path
+        self.lock_path = lock_path
+        self.on_finish = on_finish
+        self.history_size = history_size
+        self._lock = threading.Lock()
+
+    # ---------------- State file ----------------
+    def _read_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"current": None, "history": []}
+
+    def _write_state(self, state):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def _update(self, job):
+        state = self._read_state()
+        if job["state"] in ACTIVE_STATES:
+            state["current"] = job
+        else:
+            state["current"] = None
+            state["history"] = ([job] + [j for j in state["history"] if j["id"] != job["id"]])[:self.history_size]
+        self._write_state(state)
+
+    # ---------------- Public API ----------------
+    def current(self):
+        return self._read_state()["current"]
+
+    def get(self, job_id):
+        state = self._read_state()
+        if state["current"] and state["current"]["id"] == job_id:
+            return state["current"]
+        return next((j for j in state["history"] if j["id"] == job_id), None)
+
+    def history(self):
+        return self._read_state()["history"]
+
+    def _held_job(self, timeout=5.0):
+        """
+        The job of whoever holds the run lock. A holder that has only just
+        taken the lock may not have recorded its job yet, and one that is
+        finishing has already moved it to the history, so look up the id it
+        wrote to the lock file and wait briefly for either.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.current()
+            if job is None:
+                try:
+                    with open(self.lock_path) as f:
+                        job_id = f.read().strip()
+                except FileNotFoundError:
+                    job_id = ""
+                job = self.get(job_id) if job_id else None
+            if job is not None or time.monotonic() >= deadline:
+                return job
+            time.sleep(0.05)
+
+    def submit(self):
+        """Start a run, or join the one in progress. Returns (job, started)."""
+        with self._lock:
+            lock_file = open(self.lock_path, "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                # Another thread or worker holds the run lock; join its job
+                return self._held_job(), False
+
+            stale = self.current()
+            if stale:
+                # Holder of the previous run died without recording its result
+                stale.update(state="failed", error="interrupted", finished_at=datetime.now().isoformat())
+                self._update(stale)
+
+            job = {
+                "id": uuid.uuid4().hex[:12],
+                "state": "queued",
+                "submitted_at": datetime.now().isoformat(),
+                "started_at": None,
+                "finished_at": None,
+                "duration_s": None,
+                "progress": None,
+                "error": None,
+            }
+            self._update(job)
+            # Joiners that find the lock held read the job from here
+            lock_file.truncate(0)
+            lock_file.write(job["id"])
+            lock_file.flush()
+            threading.Thread(target=self._run, args=(job, lock_file), daemon=True).start()
+            return job, True
+
+    def _run(self, job, lock_file):
+        start = time.perf_counter()
+        job.update(state="running", started_at=datetime.now().isoformat())
+        self._update(job)
+        try:
+            # -u: a piped child would otherwise buffer its output until exit
+            proc = subprocess.Popen([sys.executable, "-u", self.script], stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, text=True)
+            tail = []
+            for line in proc.stdout:
+                line = line.strip()
+                if line:
+                    tail = (tail + [line])[-20:]
+                    job["progress"] = line
+                    self._update(job)
+            if proc.wait() != 0:
+                job.update(state="failed", error="\n".join(tail[-5:]) or f"exit code {proc.returncode}")
+            else:
+                job["state"] = "succeeded"
+        except Exception as e:
+            job.update(state="failed", error=str(e))
+        finally:
+            job.update(finished_at=datetime.now().isoformat(),
+                       duration_s=round(time.perf_counter() - start, 2))
+            self._update(job)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+            if job["state"] == "succeeded" and self.on_finish:
+                self.on_finish()
@@ -0,0 +1,64 @@
+# store_index.py
+import numpy as np
+
+_EMPTY_ROWS = np.empty(0, dtype=np.intp)
+
+
+class StoreIndex:
+    """
+    Lookup tables derived once per data version from the cleaned history and
+    the forecast frame, so per-request lookups are dict hits instead of
+    drop_duplicates/sort/boolean scans over the full frames.
+
+    Row lookups return positional indices into the forecast frame, in the
+    frame's original order, suitable for `fc.iloc[rows]`.
+    """
+
+    def __init__(self, history_df, forecast_df):
+        self.cities = []
+        self.stores = []
+        self.branches_by_city = {}
+        if not history_df.empty:
+            cities = history_df[["city_id","city_name"]].drop_duplicates().sort_values("city_name", kind="stable")
+            stores = history_df[["city_id","city_name","store_id","company_name","branch_name"]].drop_duplicates()
+            self.cities = cities.to_dict(orient="records")
+            self.stores = stores.to_dict(orient="records")
+
+            branches = history_df[["city_name","branch_name","store_id","company_name"]].drop_duplicates()
+            branches = branches.sort_values("branch_name", kind="stable")
+            for city, grp in branches.groupby("city_name", sort=False, observed=True):
+                self.branches_by_city[city] = grp[["branch_name","store_id","company_name"]].to_dict(orient="records")
+
+        self.n_forecast_rows = len(forecast_df)
+        self.rows_by_city = {}
+        self.rows_by_branch = {}
+        self.rows_by_city_branch = {}
+        self.rows_by_product = {}
+        if not forecast_df.empty:
+            self.rows_by_city = forecast_df.groupby("city_name", sort=False, observed=True).indices
+            self.rows_by_branch = forecast_df.groupby("branch_name", sort=False, observed=True).indices
+            self.rows_by_city_branch = forecast_df.groupby(["city_name","branch_name"], sort=False, observed=True).indices
+            self.rows_by_product = forecast_df.groupby("product_name", sort=False, observed=True).indices
+
+    def branches_for_city(self, city):
+        return self.branches_by_city.get(city, [])
+
+    def forecast_rows(self, city=None, branch=None):
+        """Positional rows of the forecast frame in scope, or None for all rows."""
+        if city and branch:
+            return self.rows_by_city_branch.get((city, branch), _EMPTY_ROWS)
+        if city:
+            return self.rows_by_city.get(city, _EMPTY_ROWS)
+        if branch:
+            return self.rows_by_branch.get(branch, _EMPTY_ROWS)
+        return None
+
+    def product_rows(self, product):
+        return self.rows_by_product.get(product, _EMPTY_ROWS)
+
+    def scope(self, forecast_df, city=None, branch=None):
+        """Forecast rows for a manager scope; the full frame when unscoped."""
+        rows = self.forecast_rows(city, branch)
+        if rows is None:
+            return forecast_df
+        return forecast_df.iloc[rows]
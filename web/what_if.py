@@ -0,0 +1,167 @@
+# what_if.py
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from scripts.compact_forecast import widen_forecast
+from scripts.inference import DEFAULT_BACKEND, MODEL_PATH, load_backend, model_signature
+from scripts.metrics import REGISTRY
+from scripts.xgb_forecast import encode_latest, forecast_batch
+
+# Features a what-if request may change, with their (min, max) and type
+OVERRIDES = {
+    "stock_hour6_22_cnt": (0, 16, int),
+    "discount": (0.0, 1.0, float),
+    "holiday_flag": (0, 1, int),
+    "activity_flag": (0, 1, int),
+}
+
+MEMO_LOOKUPS = REGISTRY.counter("what_if_memo_lookups_total", "What-if forecasts answered from the memo or computed.",
+                                ["result"])
+
+
+def as_id(value, name):
+    # bool is an int subclass and 1.5 would truncate; neither is an id
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{name} must be an integer")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer") from None
+
+
+def as_ids(values, name):
+    """A JSON list of ids; a string would otherwise be split into characters."""
+    if not isinstance(values, list):
+        raise ValueError(f"{name} must be a list of integers")
+    return sorted({as_id(v, f"each of {name}") for v in values})
+
+
+def parse_overrides(overrides, name="overrides"):
+    """{"discount": "0.3"} -> {"discount": 0.3}; ValueError on unknown features or out-of-range values."""
+    if overrides is None:
+        return {}
+    if not isinstance(overrides, dict):
+        raise ValueError(f"{name} must be an object of feature: value")
+    parsed = {}
+    for col, value in overrides.items():
+        if col not in OVERRIDES:
+            raise ValueError(f"cannot override {col} (allowed: {', '.join(OVERRIDES)})")
+        low, high, kind = OVERRIDES[col]
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{col} must be a number") from None
+        if kind is int and not number.is_integer():
+            raise ValueError(f"{col} must be a whole number")
+        if not low <= number <= high:
+            raise ValueError(f"{col} must be between {low} and {high}")
+        parsed[col] = kind(number)
+    return parsed
+
+
+class WhatIfForecaster:
+    """
+    On-demand 7-day forecasts for one store from one snapshot of the latest
+    features (the frame xgb_forecast.py writes to LATEST_FEATURES_PATH).
+
+    The snapshot is encoded once and its rows grouped by store, so a request
+    only slices its store's series, applies the overrides and runs one
+    forecast_batch over them. Results are memoized by a hash of the request and
+    the model files in a small LRU; a new snapshot gets a new forecaster.
+    """
+
+    def __init__(self, latest_df, label_encoders, backend=DEFAULT_BACKEND, model_path=MODEL_PATH,
+                 max_results=1024):
+        self.latest = encode_latest(latest_df, label_encoders).reset_index(drop=True)
+        self.store_rows = self.latest.groupby("store_id", sort=False).indices
+        self.product_ids = self.latest["product_id"].to_numpy()
+        self.backend = backend
+        self.model_path = model_path
+        self.max_results = max_results
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _select(self, store_id, product_ids):
+        rows = self.store_rows.get(store_id)
+        if rows is None:
+            raise LookupError(f"unknown store: {store_id}")
+        if product_ids is None:
+            return rows
+        wanted = np.asarray(product_ids)
+        missing = np.setdiff1d(wanted, self.product_ids[rows])
+        if len(missing):
+            raise LookupError(f"store {store_id} has no products {', '.join(map(str, missing))}")
+        return rows[np.isin(self.product_ids[rows], wanted)]
+
+    def store_scope(self, store_id):
+        """(city_name, branch_name) of a store; LookupError if it has no series."""
+        rows = self._select(as_id(store_id, "store_id"), None)
+        first = self.latest.iloc[rows[0]]
+        return first["city_name"], first["branch_name"]
+
+    def _key(self, store_id, product_ids, overrides, product_overrides):
+        payload = {
+            "store_id": store_id,
+            "product_ids": product_ids,
+            "overrides": overrides,
+            "product_overrides": product_overrides,
+            "backend": self.backend,
+            "model": model_signature(self.model_path),
+        }
+        return hashlib.blake2b(json.dumps(payload, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+    def forecast(self, store_id, product_ids=None, overrides=None, product_overrides=None):
+        """
+        Forecast of a store's series (or only `product_ids`) with `overrides`
+        applied to all of them and `product_overrides` ({product_id: overrides})
+        to single products. Returns {"store_id", "columns", "rows", "cached"}.
+        Raises ValueError for a malformed request and LookupError for an
+        unknown store or product.
+        """
+        store_id = as_id(store_id, "store_id")
+        if product_ids is not None:
+            product_ids = as_ids(product_ids, "product_ids")
+        overrides = parse_overrides(overrides)
+        if product_overrides is not None and not isinstance(product_overrides, dict):
+            raise ValueError("product_overrides must be an object of product_id: overrides")
+        product_overrides = {as_id(p, "product_id"): parse_overrides(o, f"product_overrides[{p}]")
+                             for p, o in (product_overrides or {}).items()}
+        rows = self._select(store_id, product_ids)
+        unknown = set(product_overrides) - set(self.product_ids[rows].tolist())
+        if unknown:
+            raise LookupError(f"overrides for products not in the request: {', '.join(map(str, sorted(unknown)))}")
+
+        key = self._key(store_id, product_ids, overrides, {str(p): o for p, o in product_overrides.items()})
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+        MEMO_LOOKUPS.inc(result=("hit" if result is not None else "miss"))
+        if result is not None:
+            return dict(result, cached=True)
+
+        latest_df = self.latest.iloc[rows].copy()
+        for col, value in overrides.items():
+            latest_df[col] = value
+        for product_id, product_values in product_overrides.items():
+            is_product = latest_df["product_id"].to_numpy() == product_id
+            for col, value in product_values.items():
+                latest_df.loc[is_product, col] = value
+
+        # Widened and rounded like the saved forecast, so unchanged series read
+        # the same numbers as the nightly files
+        forecast_df = widen_forecast(forecast_batch(load_backend(self.backend, self.model_path), latest_df))
+        forecast_df = forecast_df.astype(object).where(forecast_df.notna(), None)
+        result = {
+            "store_id": store_id,
+            "columns": list(forecast_df.columns),
+            "rows": forecast_df.values.tolist(),
+        }
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return dict(result, cached=False)